@@ -1,12 +1,37 @@
-import json
 import os
 import csv
 import random
-from collections import defaultdict, Counter
-import jieba
-import jieba.posseg as psg
+import hashlib
+from collections import Counter
 import pandas as pd
-import re
+from contextlib import ExitStack
+from functools import partial
+from segcache import get_cache, segmentation_version, file_digest
+from manifest import Manifest, config_version
+from reviewio import iter_review_batches
+from preprocess import clean_reviews, drop_empty, segment_batch, get_sentiment_scorer, FeatureLexicon
+from reviewstore import list_products, partition_file, iter_product_batches
+from featurestats import FeatureAggregator, empty_report
+from metrics import StageMetrics, RunMetrics
+from segpool import worker_pool
+
+# 并行进程数（1 为串行，None 为CPU核数）
+WORKERS = None
+# 分词缓存文件（置空则不使用缓存）
+SEG_CACHE_PATH = 'seg_cache.sqlite'
+# 增量处理清单文件（置空则每次全量重建）
+MANIFEST_PATH = 'analysis_manifest.json'
+# 单个产品文件每次读入处理的评论条数
+CHUNK_SIZE = 5000
+# Parquet 评论库目录（置空则直接读取 jd/ 下的JSON文件）
+STORE_DIR = None
+# 只分析该日期之后的评论，如 '2024-01-01'（仅对评论库生效）
+SINCE = None
+# 扩展特征词典文件（置空则使用下方内置的 feature_categories）
+FEATURE_LEXICON_PATH = None
+# 分阶段计时报告（JSON）与 Prometheus textfile 路径（置空则不导出）
+METRICS_PATH = 'analysis_metrics.json'
+PROM_PATH = None
 
 # 定义特征词典
 feature_categories = {
@@ -19,88 +44,22 @@ feature_categories = {
     '性价比': ['价格', '划算', '优惠', '赠品', '价值']
 }
 
-# 加载停用词表
-def load_stopwords(filepath='stopwords.txt'):
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return set([line.strip() for line in f])
-    except:
-        return set()
-
-stopwords = load_stopwords()
-
-# 分词函数
-def seg_text(text, use_stopwords=True, use_pos=False):
-    min_word_length = 1
-    if use_pos:
-        words = psg.cut(text)
-        if use_stopwords:
-            return [(w.word, w.flag) for w in words if w.word not in stopwords and len(w.word) >= min_word_length]
-        return [(w.word, w.flag) for w in words if len(w.word) >= min_word_length]
-    else:
-        words = jieba.cut(text)
-        if use_stopwords:
-            return [w for w in words if w not in stopwords and len(w) >= min_word_length]
-        return [w for w in words if len(w) >= min_word_length]
-
-# 文本清洗函数
-def clean_text(text):
-    if not isinstance(text, str):
-        return ""
-    emoji_pattern = re.compile(
-        r"[" u"\U0001F600-\U0001F64F" u"\U0001F300-\U0001F5FF" u"\U0001F680-\U0001F6FF" u"\U0001F1E0-\U0001F1FF" "]+",
-        flags=re.UNICODE)
-    text = emoji_pattern.sub(r'', text)
-    text = re.sub(r'[^\u4e00-\u9fa5，。！？、；："' "'" "’‘（）《》【】]", '', text)
-    text = re.sub(r'[a-zA-Z0-9]', '', text)
-    text = re.sub(r'\s+', '', text)
-    return text.strip()
+feature_lexicon = (FeatureLexicon.from_file(FEATURE_LEXICON_PATH) if FEATURE_LEXICON_PATH
+                   else FeatureLexicon(feature_categories))
 
 # 特征提取函数
 def extract_features(segmented_text, pos_tags):
-    features = defaultdict(list)
-    for word, pos in pos_tags:
-        if pos.startswith(('n', 'v')):
-            for category, keywords in feature_categories.items():
-                if word in keywords:
-                    features[category].append(word)
-                    break
-            else:
-                if pos.startswith('n'):
-                    features['其他'].append(word)
-    return dict(features)
+    return feature_lexicon.tag(pos_tags)
 
 # 生成分析报告函数
 def generate_analysis_report(df):
-    report = {
-        '优点': defaultdict(list),
-        '缺点': defaultdict(list),
-        'statistics': {
-            '总评论数': len(df),
-            '正面评论数': len(df[df['sentiment_label'] == '正面']),
-            '负面评论数': len(df[df['sentiment_label'] == '负面'])
-        }
-    }
-
-    positive_df = df[df['sentiment_label'] == '正面']
-    for _, row in positive_df.iterrows():
-        for category, words in row['features'].items():
-            report['优点'][category].extend(words)
-
-    negative_df = df[df['sentiment_label'] == '负面']
-    for _, row in negative_df.iterrows():
-        for category, words in row['features'].items():
-            report['缺点'][category].extend(words)
-
-    for aspect in ['优点', '缺点']:
-        for category in report[aspect]:
-            counter = Counter(report[aspect][category])
-            report[aspect][category] = [{"特征词": word, "出现次数": count} for word, count in counter.most_common(5)]
-    return report
+    aggregator = FeatureAggregator()
+    aggregator.add(df, product_id='')
+    return aggregator.reports().get('', empty_report())
 
 # 指标打分函数
 def evaluate_product_features_by_category(report):
-    evaluation = {category: 3 for category in feature_categories.keys()}
+    evaluation = {category: 3 for category in feature_lexicon.categories.keys()}
     for category in evaluation.keys():
         positive_word_freq = report['优点'].get(category, [])
         negative_word_freq = report['缺点'].get(category, [])
@@ -114,21 +73,228 @@ def evaluate_product_features_by_category(report):
         evaluation[category] = score
     return evaluation
 
-# 加载情感词典
-def load_sentiment_dict(positive_path='positive.txt', negative_path='negative.txt'):
-    with open(positive_path, 'r', encoding='utf-8') as f:
-        positive_words = set([line.strip() for line in f if line.strip()])
-    with open(negative_path, 'r', encoding='utf-8') as f:
-        negative_words = set([line.strip() for line in f if line.strip()])
-    return positive_words, negative_words
+# 情感打分器（进程内只加载一次情感词典）
+sentiment_scorer = get_sentiment_scorer()
+
+# 随机抽取评论
+def sample_comments(reviews, num=3):
+    if len(reviews) >= num:
+        return random.sample(reviews, num)
+    elif len(reviews) > 0:
+        return list(reviews) + ['暂无'] * (num - len(reviews))
+    else:
+        return ['暂无'] * num
+
+class ReservoirSampler:
+    """蓄水池抽样：分块读取评论时等概率保留 num 条，结果与 sample_comments 一致"""
 
-positive_set, negative_set = load_sentiment_dict()
+    def __init__(self, num=3):
+        self.num = num
+        self.seen = 0
+        self.items = []
+
+    def extend(self, reviews):
+        for review in reviews:
+            if len(self.items) < self.num:
+                self.items.append(review)
+            else:
+                j = random.randrange(self.seen + 1)
+                if j < self.num:
+                    self.items[j] = review
+            self.seen += 1
+
+    def result(self):
+        return self.items + ['暂无'] * (self.num - len(self.items))
+
+def review_digest(name, text):
+    """(name, 评论) 的8字节 blake2b 摘要，跨块去重时代替原文存入集合，内存占用与评论长度无关"""
+    return hashlib.blake2b(f'{name}\0{text}'.encode('utf-8'), digest_size=8).digest()
+
+
+def prepare_reviews(df, seen=None, metrics=None):
+    """
+    对一块评论做清洗、分词、特征提取和情感分析
+
+    参数:
+    seen - 跨块去重用的 (name, 评论) 摘要集合（见 review_digest），分块处理同一文件时共用
+    metrics - StageMetrics，记录各阶段耗时，并累加计数 'empty_after_clean'（清洗后为空被丢弃的条数）
+
+    来自评论库的数据已带 cleaned_content 列，不再重复清洗
+    """
+    if metrics is None:
+        metrics = StageMetrics()
+
+    # 数据预处理
+    with metrics.stage('dedup', len(df)):
+        df = df.drop_duplicates(subset=['name', '评论'])
+        df = df.dropna(subset=['评论'])
+        if seen is not None:
+            keys = [review_digest(name, text) for name, text in zip(df['name'], df['评论'])]
+            mask = [key not in seen for key in keys]
+            seen.update(keys)
+            df = df[mask]
+    with metrics.stage('clean', len(df)):
+        if 'cleaned_content' in df:
+            df, dropped = drop_empty(df)
+        else:
+            df, dropped = clean_reviews(df)
+    metrics.count('empty_after_clean', dropped)
+    if df.empty:
+        return df
+
+    # 分词：词性标注分词用于特征提取，普通分词用于关键词和情感分析；
+    # posseg 的 HMM 切分与 jieba.cut 不同（如 没有丢包 -> 丢/包），不能直接取其词列代替
+    with metrics.stage('segment', len(df)):
+        df['segmented'] = pd.Series(segment_batch(df['cleaned_content'], use_pos=False, cache_path=SEG_CACHE_PATH),
+                                    index=df.index, dtype=object)
+    with metrics.stage('segment_pos', len(df)):
+        df['segmented_pos'] = pd.Series(segment_batch(df['cleaned_content'], use_pos=True, cache_path=SEG_CACHE_PATH),
+                                        index=df.index, dtype=object)
+    with metrics.stage('features', len(df)):
+        df['features'] = pd.Series(feature_lexicon.tag_many(df['segmented_pos']), index=df.index, dtype=object)
+
+    # 情感分析
+    with metrics.stage('sentiment', len(df)):
+        return pd.concat([df, sentiment_scorer.score(df['segmented'])], axis=1)
+
+def analyze_product(product_id, batches, metrics=None, allow_empty=False):
+    """
+    分析单个产品的评论
+
+    参数:
+    batches - 逐块产出评论 DataFrame 的迭代器，峰值内存由块大小决定；
+              关键词、特征词频只保留累计计数，抽样评论使用蓄水池抽样
+    metrics - StageMetrics，记录读取及各处理阶段的耗时（见 prepare_reviews）
+    allow_empty - 没有评论时返回默认行（按日期过滤后窗口内没有评论属于正常结果），否则报错
+
+    返回:
+    (关键词行, 评分行, 抽样评论行)，均以产品ID开头，可直接写入对应CSV
+    """
+    if metrics is None:
+        metrics = StageMetrics()
+    seen = set()
+    word_counter = Counter()
+    aggregator = FeatureAggregator()
+    pos_sampler = ReservoirSampler(3)
+    neg_sampler = ReservoirSampler(3)
+    has_reviews = False
+
+    for df in metrics.timed_iter('load', batches):
+        has_reviews = True
+        df = prepare_reviews(df, seen, metrics)
+        if df.empty:
+            continue
+        with metrics.stage('aggregate', len(df)):
+            pos_sampler.extend(df[df['sentiment_label'] == '正面']['评论'].tolist())
+            neg_sampler.extend(df[df['sentiment_label'] == '负面']['评论'].tolist())
+            word_counter.update(word for sublist in df['segmented'] for word in sublist)
+            aggregator.add(df, product_id)
+
+    if not has_reviews and not allow_empty:
+        raise ValueError('文件中没有评论数据')
+
+    with metrics.stage('report'):
+        return _product_rows(product_id, word_counter, aggregator, pos_sampler, neg_sampler)
+
+def _product_rows(product_id, word_counter, aggregator, pos_sampler, neg_sampler):
+    # 随机抽取评论
+    review_row = [product_id] + pos_sampler.result() + neg_sampler.result()
+
+    # 生成关键词-频率对
+    keyword_freq_pairs = []
+    for word, freq in word_counter.most_common(50):
+        if word not in ['路由器', '款']:
+            keyword_freq_pairs.extend([word, freq])
+
+    # 填充到50个关键词
+    while len(keyword_freq_pairs) < 100:  # 50对关键词+频率
+        keyword_freq_pairs.extend(['暂无', 0])
+    keyword_row = [product_id] + keyword_freq_pairs[:100]
+
+    # 生成评分（产品没有有效评论时各类别均记默认分）
+    product_scores = aggregator.scores(feature_lexicon.categories).get(
+        product_id, evaluate_product_features_by_category(empty_report()))
+    score_row = [product_id] + list(product_scores.values())
+
+    return keyword_row, score_row, review_row
+
+def analyze_product_file(file_path, chunk_size=CHUNK_SIZE, metrics=None):
+    """分析单个产品的JSON评论文件，评论按 chunk_size 条一块流式读取"""
+    product_id = os.path.splitext(os.path.basename(file_path))[0]
+    return analyze_product(product_id, iter_review_batches(file_path, chunk_size), metrics)
+
+def analyze_store_product(product_id, store_dir, chunk_size=CHUNK_SIZE, since=None, metrics=None):
+    """分析评论库中的单个产品，只读取需要的列；since 给定时只分析该日期之后的评论"""
+    batches = iter_product_batches(product_id, store_dir, columns=['name', '评论', 'cleaned_content'],
+                                   since=since, batch_size=chunk_size)
+    return analyze_product(product_id, batches, metrics, allow_empty=bool(since))
+
+def _analyze_source_safe(source, chunk_size=CHUNK_SIZE, store_dir=None, since=None):
+    # 进程池中的异常统一转成错误信息返回，由写入端打印，避免单个文件中断整批任务；
+    # 计时以 snapshot 字典形式回传主进程汇总
+    metrics = StageMetrics()
+    try:
+        if store_dir:
+            rows = analyze_store_product(source, store_dir, chunk_size, since, metrics)
+        else:
+            rows = analyze_product_file(source, chunk_size, metrics)
+        return rows, metrics.snapshot(), None
+    except Exception as e:
+        return None, metrics.snapshot(), str(e)
+
+def analysis_version(since=None):
+    """影响分析结果的配置版本：分词词典、停用词、情感词典、特征词典与日期过滤条件"""
+    return config_version(segmentation_version(), file_digest('positive.txt'), file_digest('negative.txt'),
+                          feature_lexicon.categories, since)
+
+def process_files_in_folder(folder_path, keyword_csv_path, score_csv_path, reviews_csv_path, workers=1,
+                            manifest_path=None, chunk_size=CHUNK_SIZE, store_dir=None, since=None,
+                            metrics_path=None, prom_path=None):
+    """
+    处理文件夹中所有JSON评论文件，写出关键词、评分和抽样评论CSV
+
+    参数:
+    workers - 并行进程数，1 为串行，None 为CPU核数；
+              各进程分析整个产品文件，结果回传主进程按文件名顺序统一写入
+    manifest_path - 增量处理清单路径；给定时只重新分析新增或变化的文件，
+                    其余产品的输出行从清单取回，与新结果合并后重写三个CSV
+    chunk_size - 单个文件每块处理的评论条数，决定每个进程的峰值内存
+    store_dir - Parquet 评论库目录；给定时从评论库读取各产品（忽略 folder_path）
+    since - 只分析该日期（含）之后的评论，仅对评论库生效
+    metrics_path - 分阶段计时报告（JSON）输出路径，含整体与各产品明细
+    prom_path - Prometheus textfile 输出路径，只含整体指标
+    """
+    run_metrics = RunMetrics('analysis')
+    # 按名称排序，保证串行与并行模式的输出行顺序一致
+    # names 为各产品在清单中的名称，paths 用于计算文件指纹，sources 交给分析进程
+    if store_dir:
+        names = list_products(store_dir)
+        paths = {name: partition_file(store_dir, name) for name in names}
+        sources = dict(zip(names, names))
+    else:
+        names = sorted(f for f in os.listdir(folder_path) if f.endswith('.json'))
+        paths = {name: os.path.join(folder_path, name) for name in names}
+        sources = paths
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    manifest = Manifest(manifest_path, analysis_version(since)) if manifest_path else None
+    cached = {}
+    if manifest is not None:
+        manifest.prune(names)
+        for name in names:
+            rows = manifest.cached_rows(name, paths[name])
+            if rows is not None:
+                cached[name] = rows
+        print(f"增量处理：{len(cached)} 个文件未变化，{len(names) - len(cached)} 个文件需要重新分析")
+    pending = [sources[name] for name in names if name not in cached]
+    analyze = partial(_analyze_source_safe, chunk_size=chunk_size, store_dir=store_dir, since=since)
 
-def process_files_in_folder(folder_path, keyword_csv_path, score_csv_path, reviews_csv_path):
     # 修改1: 使用utf-8-sig编码解决Excel乱码问题
     with open(keyword_csv_path, 'w', newline='', encoding='utf-8-sig') as kcsv, \
             open(score_csv_path, 'w', newline='', encoding='utf-8-sig') as scsv, \
-            open(reviews_csv_path, 'w', newline='', encoding='utf-8-sig', errors='replace') as rcsv:
+            open(reviews_csv_path, 'w', newline='', encoding='utf-8-sig', errors='replace') as rcsv, \
+            ExitStack() as stack:
 
         # 初始化CSV写入器
         kwriter = csv.writer(kcsv)
@@ -137,90 +303,55 @@ def process_files_in_folder(folder_path, keyword_csv_path, score_csv_path, revie
 
         # 写入表头
         kwriter.writerow(['id'] + [f'关键词{i // 2 + 1}' if i % 2 == 0 else f'频率{i // 2 + 1}' for i in range(100)])
-        swriter.writerow(['id'] + list(feature_categories.keys()))
+        swriter.writerow(['id'] + list(feature_lexicon.categories.keys()))
         rwriter.writerow(['product_id', 'pos1', 'pos2', 'pos3', 'neg1', 'neg2', 'neg3'])
 
-        # 遍历JSON文件
-        for filename in os.listdir(folder_path):
-            if filename.endswith('.json'):
-                file_path = os.path.join(folder_path, filename)
-                product_id = os.path.splitext(filename)[0]
-
-                try:
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        reviews = json.load(f)
-                    df = pd.DataFrame(reviews)
-
-                    # 数据预处理
-                    df = df.drop_duplicates(subset=['name', '评论'])
-                    df = df.dropna(subset=['评论'])
-                    df['cleaned_content'] = df['评论'].apply(clean_text)
-                    df = df[df['cleaned_content'].str.len() > 0]
-
-                    # 特征提取
-                    df['segmented'] = df['cleaned_content'].apply(
-                        lambda x: seg_text(x, use_stopwords=True, use_pos=False))
-                    df['segmented_pos'] = df['cleaned_content'].apply(
-                        lambda x: seg_text(x, use_stopwords=True, use_pos=True))
-                    df['features'] = df['segmented_pos'].apply(lambda x: extract_features([w[0] for w in x], x))
-
-                    # 情感分析
-                    def sentiment_analyzer(word_list):
-                        positive_count = sum(1 for word in word_list if word in positive_set)
-                        negative_count = sum(1 for word in word_list if word in negative_set)
-                        if positive_count > negative_count:
-                            return '正面', positive_count, negative_count
-                        elif negative_count > positive_count:
-                            return '负面', positive_count, negative_count
-                        else:
-                            return '中性', positive_count, negative_count
-
-                    sentiment_results = df['segmented'].apply(
-                        lambda x: pd.Series(sentiment_analyzer(x),
-                                            index=['sentiment_label', 'positive_count', 'negative_count'])
-                    )
-                    df = pd.concat([df, sentiment_results], axis=1)
-
-                    # 随机抽取评论（新增核心功能）
-                    def sample_comments(reviews, num=3):
-                        if len(reviews) >= num:
-                            return random.sample(reviews, num)
-                        elif len(reviews) > 0:
-                            return list(reviews) + ['暂无'] * (num - len(reviews))
-                        else:
-                            return ['暂无'] * num
-
-                    pos_comments = sample_comments(df[df['sentiment_label'] == '正面']['评论'].tolist())
-                    neg_comments = sample_comments(df[df['sentiment_label'] == '负面']['评论'].tolist())
-
-                    # 写入评论数据
-                    rwriter.writerow([product_id] + pos_comments + neg_comments)
-
-                    # 关键词处理（改进格式）
-                    all_words = [word for sublist in df['segmented'] for word in sublist]
-                    word_counter = Counter(all_words)
-
-                    # 生成关键词-频率对
-                    keyword_freq_pairs = []
-                    for word, freq in word_counter.most_common(50):
-                        if word not in ['路由器', '款']:
-                            keyword_freq_pairs.extend([word, freq])
-
-                    # 填充到50个关键词
-                    while len(keyword_freq_pairs) < 100:  # 50对关键词+频率
-                        keyword_freq_pairs.extend(['暂无', 0])
-
-                    kwriter.writerow([product_id] + keyword_freq_pairs[:100])
-
-                    # 生成评分
-                    analysis_report = generate_analysis_report(df)
-                    product_scores = evaluate_product_features_by_category(analysis_report)
-                    swriter.writerow([product_id] + list(product_scores.values()))
-
-                    print(f"成功处理：{product_id}")
-
-                except Exception as e:
-                    print(f"处理文件 {filename} 时出错: {str(e)}")
+        if workers > 1 and len(pending) > 1:
+            # 工作进程继承主进程已初始化的 jieba 词典（不支持 fork 的平台各自初始化一次）
+            executor = stack.enter_context(worker_pool(workers))
+            # map 按提交顺序返回结果，写入顺序与串行模式相同
+            results = executor.map(analyze, pending)
+        else:
+            results = map(analyze, pending)
+
+        for name in names:
+            if name in cached:
+                rows = cached[name]
+            else:
+                analyzed, snapshot, error = next(results)
+                run_metrics.add_product(name, snapshot)
+                if error is not None:
+                    print(f"处理文件 {name} 时出错: {error}")
+                    # 出错的文件不记入清单，下次运行会重试
+                    if manifest is not None:
+                        manifest.discard(name)
+                    continue
+                keyword_row, score_row, review_row = analyzed
+                rows = {'keywords': keyword_row, 'scores': score_row, 'reviews': review_row}
+                if manifest is not None:
+                    manifest.update(name, paths[name], rows)
+                empty_count = snapshot['counters'].get('empty_after_clean', 0)
+                print(f"成功处理：{keyword_row[0]}（清洗后为空丢弃 {empty_count} 条）")
+            with run_metrics.stage('csv_write'):
+                rwriter.writerow(rows['reviews'])
+                kwriter.writerow(rows['keywords'])
+                swriter.writerow(rows['scores'])
+
+    print(f"本次分析清洗后为空共丢弃 {run_metrics.counters.get('empty_after_clean', 0)} 条评论")
+    if manifest is not None:
+        manifest.save()
+
+    cache = get_cache(SEG_CACHE_PATH)
+    if cache is not None:
+        stats = cache.stats()
+        print(f"分词缓存：命中 {stats.get('hits', 0)} 次，未命中 {stats.get('misses', 0)} 次，"
+              f"当前 {stats['entries']} 条")
+
+    run_metrics.print_summary()
+    if metrics_path:
+        run_metrics.export_json(metrics_path)
+    if prom_path:
+        run_metrics.export_prometheus(prom_path)
 
 # 运行参数设置
 if __name__ == "__main__":
@@ -228,7 +359,13 @@ if __name__ == "__main__":
         folder_path='jd',
         keyword_csv_path='keywords.csv',
         score_csv_path='scores.csv',
-        reviews_csv_path='sampled_reviews.csv'
+        reviews_csv_path='sampled_reviews.csv',
+        workers=WORKERS,
+        manifest_path=MANIFEST_PATH,
+        store_dir=STORE_DIR,
+        since=SINCE,
+        metrics_path=METRICS_PATH,
+        prom_path=PROM_PATH
     )
     print("所有文件处理完成")
 
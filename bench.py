@@ -0,0 +1,300 @@
+# bench.py
+"""
+文本分析流水线基准测试
+1. 用 positive.txt / negative.txt / 特征词典中的词生成可复现的京东风格合成评论语料
+2. 端到端计时 analysis.process_files_in_folder 与 lda.process_jd_folder，各阶段耗时取自
+   两者导出的分阶段计时报告，输出每个阶段的耗时、评论吞吐量（条/秒），以及整次运行的主进程与子进程峰值内存
+3. 与保存的基线比较，吞吐量下降超过容忍度时以非零状态退出
+4. 用 python -X importtime 测量 analysis / lda 的启动导入耗时，超过预算或导入了绘图库时以非零状态退出
+
+用法（在项目根目录运行）：
+python bench.py --products 20 --reviews 500
+python bench.py --update-baseline
+python bench.py --startup-only --startup-budget 1.0
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import subprocess
+import argparse
+import tempfile
+import importlib.util
+
+DEFAULT_BASELINE = 'bench_baseline.json'
+# 启动导入耗时预算（秒），以及无可视化运行时不应被导入的重量级依赖
+DEFAULT_STARTUP_BUDGET = 1.0
+STARTUP_MODULES = ['analysis', 'lda']
+HEAVY_MODULES = {'matplotlib', 'seaborn', 'wordcloud', 'pyLDAvis', 'pyecharts', 'gensim'}
+
+# 合成评论中穿插的常见口语词
+FILLER_WORDS = ['这个', '路由器', '用了', '一周', '感觉', '家里', '网络', '快递', '很快', '包装', '老人', '房间',
+                '客厅', '卧室', '手机', '电脑', '游戏', '看视频', '晚上', '白天', '朋友', '推荐', '买', '京东']
+PUNCTUATION = ['，', '。', '！', '、']
+NOISE = ['😀', '👍', 'wifi6', 'AX3000', '5G', '  ', '\n']
+
+
+def load_words(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def generate_corpus(out_dir, num_products=20, reviews_per_product=500, seed=42):
+    """
+    在 out_dir 下生成 <产品ID>.json 评论文件（JSON 数组，与早期 jdcomments 的输出相同）
+
+    相同参数和种子生成的语料完全一致
+    """
+    from analysis import feature_categories
+
+    rnd = random.Random(seed)
+    positive_words = load_words('positive.txt')
+    negative_words = load_words('negative.txt')
+    feature_words = [word for words in feature_categories.values() for word in words]
+    os.makedirs(out_dir, exist_ok=True)
+
+    for p in range(num_products):
+        product_id = str(100000000 + p)
+        # 每个产品有自己的好评倾向，使情感分布在产品间有差异
+        positive_ratio = rnd.uniform(0.3, 0.9)
+        reviews = []
+        for i in range(reviews_per_product):
+            sentiment_words = positive_words if rnd.random() < positive_ratio else negative_words
+            parts = []
+            for _ in range(rnd.randint(3, 12)):
+                r = rnd.random()
+                if r < 0.35:
+                    parts.append(rnd.choice(feature_words))
+                elif r < 0.65:
+                    parts.append(rnd.choice(sentiment_words))
+                else:
+                    parts.append(rnd.choice(FILLER_WORDS))
+                if rnd.random() < 0.3:
+                    parts.append(rnd.choice(PUNCTUATION))
+                if rnd.random() < 0.05:
+                    parts.append(rnd.choice(NOISE))
+            # 少量重复的模板好评，贴近真实数据中的重复评论
+            text = '好评' if rnd.random() < 0.03 else ''.join(parts)
+            reviews.append({
+                'name': f'用户{rnd.randint(0, reviews_per_product * 2)}',
+                '评分': str(rnd.randint(1, 5)),
+                '产品': rnd.choice(['AX3000', 'AX6000', 'BE3600']),
+                '日期': f'2024-{rnd.randint(1, 12):02d}-{rnd.randint(1, 28):02d} {rnd.randint(0, 23):02d}:00:00',
+                '评论': text
+            })
+        with open(os.path.join(out_dir, f'{product_id}.json'), 'w', encoding='utf-8') as f:
+            json.dump(reviews, f, ensure_ascii=False, indent=2)
+
+
+def peak_rss_mb():
+    """
+    整次运行的峰值常驻内存（MB）；不支持的平台返回 None
+
+    返回:
+    {'self': 主进程峰值, 'children': 已结束的子进程（分词、训练工作进程）中最大的峰值}，
+    两者都是进程启动以来的最高水位，不能归到单个阶段
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Linux 单位为 KB，macOS 为字节
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {
+        'self': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        'children': round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1)
+    }
+
+
+def stage_results(pipeline, metrics_path, seconds):
+    """
+    把流水线自身导出的分阶段计时报告转换为基准结果，并加上整次运行的端到端耗时
+
+    返回:
+    {'<pipeline>.<阶段>': {'seconds', 'items', 'items_per_sec'}}，
+    '<pipeline>.total' 为整次调用，条数取读取阶段的评论数
+    """
+    with open(metrics_path, 'r', encoding='utf-8') as f:
+        report = json.load(f)
+    results = {}
+    for stage, values in report['stages'].items():
+        results[f'{pipeline}.{stage}'] = {
+            'seconds': round(values['seconds'], 4),
+            'items': values['items'],
+            'items_per_sec': round(values['items_per_sec'], 1) if values['items_per_sec'] else None
+        }
+    items = report['stages'].get('load', {}).get('items', 0)
+    results[f'{pipeline}.total'] = {
+        'seconds': round(seconds, 4),
+        'items': items,
+        'items_per_sec': round(items / seconds, 1) if seconds > 0 and items else None
+    }
+    return results
+
+
+def bench_analysis(corpus_dir, work_dir):
+    """端到端计时 analysis.process_files_in_folder，各阶段耗时取自其 metrics_path 报告"""
+    import analysis
+
+    # 关闭分词缓存，测量真实分词开销
+    analysis.SEG_CACHE_PATH = ''
+    metrics_path = os.path.join(work_dir, 'analysis_metrics.json')
+    start = time.perf_counter()
+    analysis.process_files_in_folder(corpus_dir, os.path.join(work_dir, 'keywords.csv'),
+                                     os.path.join(work_dir, 'scores.csv'),
+                                     os.path.join(work_dir, 'sampled_reviews.csv'), workers=1,
+                                     metrics_path=metrics_path)
+    return stage_results('analysis', metrics_path, time.perf_counter() - start)
+
+
+def bench_lda(corpus_dir, work_dir):
+    """端到端计时 lda.process_jd_folder（不含可视化），各阶段耗时取自其 metrics_path 报告"""
+    if importlib.util.find_spec('gensim') is None:
+        print("跳过 LDA 基准测试（缺少依赖：gensim）")
+        return {}
+    import lda
+
+    lda.SEG_CACHE_PATH = ''
+    metrics_path = os.path.join(work_dir, 'lda_metrics.json')
+    start = time.perf_counter()
+    lda.process_jd_folder(corpus_dir, os.path.join(work_dir, 'lda_keywords.csv'), metrics_path=metrics_path,
+                          visualize=False)
+    return stage_results('lda', metrics_path, time.perf_counter() - start)
+
+
+def bench_startup(modules=STARTUP_MODULES, repeat=3):
+    """
+    在新进程中用 -X importtime 测量各入口模块的导入耗时（取 repeat 次中的最小值）
+
+    返回:
+    {模块: {'seconds': 导入耗时, 'heavy_imports': 导入的重量级依赖, 'slowest': 自身耗时最高的5个模块}}
+    """
+    root = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for module in modules:
+        best = None
+        for _ in range(repeat):
+            proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                                  cwd=root, capture_output=True, text=True, encoding='utf-8', errors='replace')
+            if proc.returncode != 0:
+                raise RuntimeError(f"导入 {module} 失败：{proc.stderr.strip().splitlines()[-1:]}")
+            # 每行格式：import time: 自身微秒 | 累计微秒 | 缩进的模块名
+            timings = {}
+            for line in proc.stderr.splitlines():
+                if not line.startswith('import time:') or 'self [us]' in line:
+                    continue
+                self_us, cumulative_us, name = line[len('import time:'):].split('|')
+                timings[name.strip()] = (int(self_us), int(cumulative_us))
+            if module not in timings:
+                continue
+            seconds = timings[module][1] / 1e6
+            if best is None or seconds < best['seconds']:
+                best = {
+                    'seconds': round(seconds, 4),
+                    'heavy_imports': sorted({name.split('.')[0] for name in timings} & HEAVY_MODULES),
+                    'slowest': [name for name, _ in sorted(timings.items(), key=lambda x: -x[1][0])[:5]]
+                }
+        results[module] = best
+    return results
+
+
+def check_startup(results, budget):
+    """打印启动耗时，返回超出预算或导入了重量级依赖的模块列表"""
+    failures = []
+    print(f"\n{'入口模块':<12}{'导入耗时(秒)':>12}  重量级依赖")
+    for module, r in results.items():
+        print(f"{module:<16}{r['seconds']:>12.3f}  {','.join(r['heavy_imports']) or '无'}")
+        if r['seconds'] > budget or r['heavy_imports']:
+            failures.append(module)
+            print(f"  {module} 超出启动预算 {budget} 秒或导入了绘图依赖；自身耗时最高：{', '.join(r['slowest'])}")
+    return failures
+
+
+def compare(results, baseline, tolerance):
+    """返回吞吐量低于基线 (1 - tolerance) 倍的阶段列表"""
+    regressions = []
+    for stage, current in results.items():
+        expected = baseline.get('stages', {}).get(stage)
+        if not expected or not expected.get('items_per_sec') or not current.get('items_per_sec'):
+            continue
+        ratio = current['items_per_sec'] / expected['items_per_sec']
+        if ratio < 1 - tolerance:
+            regressions.append((stage, expected['items_per_sec'], current['items_per_sec'], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='文本分析流水线基准测试')
+    parser.add_argument('--products', type=int, default=20, help='合成产品数')
+    parser.add_argument('--reviews', type=int, default=500, help='每个产品的评论数')
+    parser.add_argument('--seed', type=int, default=42, help='语料随机种子')
+    parser.add_argument('--skip-lda', action='store_true', help='不测试 LDA 阶段')
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='基线文件路径')
+    parser.add_argument('--update-baseline', action='store_true', help='用本次结果覆盖基线')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='允许的吞吐量下降比例')
+    parser.add_argument('--output', help='把本次结果另存为JSON')
+    parser.add_argument('--startup-budget', type=float, default=DEFAULT_STARTUP_BUDGET,
+                        help='入口模块导入耗时预算（秒）')
+    parser.add_argument('--startup-only', action='store_true', help='只做启动耗时检查')
+    args = parser.parse_args()
+
+    startup = bench_startup()
+    startup_failures = check_startup(startup, args.startup_budget)
+    if args.startup_only:
+        return 1 if startup_failures else 0
+
+    work_dir = tempfile.mkdtemp(prefix='jd_bench_')
+    try:
+        corpus_dir = os.path.join(work_dir, 'jd')
+        generate_corpus(corpus_dir, args.products, args.reviews, args.seed)
+        results = bench_analysis(corpus_dir, work_dir)
+        if not args.skip_lda:
+            results.update(bench_lda(corpus_dir, work_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        'corpus': {'products': args.products, 'reviews_per_product': args.reviews, 'seed': args.seed},
+        'peak_rss_mb': peak_rss_mb(),
+        'startup': startup,
+        'stages': results
+    }
+    print(f"\n{'阶段':<36}{'耗时(秒)':>10}{'条/秒':>12}")
+    for stage, r in results.items():
+        print(f"{stage:<38}{r['seconds']:>10.3f}{r['items_per_sec'] or 0:>14.1f}")
+    if report['peak_rss_mb'] is not None:
+        print(f"整次运行峰值内存：主进程 {report['peak_rss_mb']['self']:.1f} MB，"
+              f"子进程 {report['peak_rss_mb']['children']:.1f} MB")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已更新：{args.baseline}")
+        return 1 if startup_failures else 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\n未找到基线 {args.baseline}，可使用 --update-baseline 生成")
+        return 1 if startup_failures else 0
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    if baseline.get('corpus') != report['corpus']:
+        print("\n警告：本次语料参数与基线不同，比较结果仅供参考")
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n性能回退（吞吐量下降超过 {args.tolerance:.0%}）：")
+        for stage, expected, current, ratio in regressions:
+            print(f"  {stage}: 基线 {expected:.1f} 条/秒 -> 本次 {current:.1f} 条/秒（{ratio:.0%}）")
+        return 1
+    print("\n与基线相比未发现性能回退")
+    return 1 if startup_failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,143 @@
+# featurestats.py
+"""
+特征词统计与评分的聚合引擎
+把 features 列展开成 (product_id, sentiment, category, word) 长表，
+按分组一次性算出每个产品各类别的前5特征词（product_analysis_report.json 的优点/缺点）
+和 1-10 分的类别评分（scores.csv），取代逐行 iterrows 累加
+"""
+
+import numpy as np
+import pandas as pd
+
+ASPECTS = {'正面': '优点', '负面': '缺点'}
+_KEYS = ['product_id', 'sentiment', 'category', 'word']
+
+
+def explode_features(df, product_id=None):
+    """
+    展开正面/负面评论的 features 列
+
+    参数:
+    df - 含 features、sentiment_label 列的 DataFrame；有 product_id 列时按列区分产品
+    product_id - df 没有 product_id 列时使用的产品ID
+
+    返回:
+    长表，每个特征词出现一行，行顺序与逐行遍历评论、类别、特征词的顺序相同
+    """
+    sub = df[df['sentiment_label'].isin(list(ASPECTS))]
+    long = pd.DataFrame({
+        'product_id': sub['product_id'] if 'product_id' in sub else product_id,
+        'sentiment': sub['sentiment_label'],
+        'item': sub['features'].map(lambda features: list(features.items()))
+    })
+    long = long.explode('item').dropna(subset=['item'])
+    long['category'] = long['item'].str[0]
+    long['word'] = long['item'].str[1]
+    long = long.drop(columns='item').explode('word').dropna(subset=['word'])
+    return long.reset_index(drop=True)
+
+
+def empty_report():
+    return {'优点': {}, '缺点': {}, 'statistics': {'总评论数': 0, '正面评论数': 0, '负面评论数': 0}}
+
+
+class FeatureAggregator:
+    """
+    跨块、跨产品累计特征词频
+
+    只保存按 (产品, 情感, 类别, 特征词) 聚合后的计数和首次出现位置，
+    内存与词表大小有关而与评论条数无关；首次出现位置用于在词频相同时保持 Counter.most_common 的顺序
+    """
+
+    def __init__(self):
+        self.counts = pd.DataFrame({'count': pd.Series(dtype='int64'), 'first': pd.Series(dtype='int64')},
+                                   index=pd.MultiIndex.from_arrays([[]] * len(_KEYS), names=_KEYS))
+        self.review_counts = pd.Series(dtype='int64', index=pd.MultiIndex.from_arrays([[], []],
+                                                                                      names=['product_id', 'sentiment']))
+        self.offset = 0
+
+    def add(self, df, product_id=None):
+        """累加一块已完成情感分析和特征提取的评论"""
+        sentiments = pd.DataFrame({
+            'product_id': df['product_id'] if 'product_id' in df else product_id,
+            'sentiment': df['sentiment_label']
+        })
+        self.review_counts = self.review_counts.add(sentiments.value_counts(sort=False), fill_value=0).astype('int64')
+
+        long = explode_features(df, product_id)
+        if long.empty:
+            return
+        long['order'] = np.arange(self.offset, self.offset + len(long))
+        self.offset += len(long)
+        chunk = long.groupby(_KEYS, sort=False).agg(count=('word', 'size'), first=('order', 'min'))
+        if self.counts.empty:
+            self.counts = chunk
+        else:
+            self.counts = (pd.concat([self.counts, chunk])
+                           .groupby(level=_KEYS, sort=False)
+                           .agg({'count': 'sum', 'first': 'min'}))
+
+    def products(self):
+        return list(self.review_counts.index.get_level_values('product_id').unique())
+
+    def top_words(self, top_n=5):
+        """各 (产品, 情感, 类别) 词频最高的 top_n 个特征词，类别按首次出现排序"""
+        counts = self.counts.reset_index()
+        counts['category_first'] = counts.groupby(['product_id', 'sentiment', 'category'])['first'].transform('min')
+        counts = counts.sort_values(['product_id', 'sentiment', 'category_first', 'count', 'first'],
+                                    ascending=[True, True, True, False, True], kind='stable')
+        return counts.groupby(['product_id', 'sentiment', 'category'], sort=False).head(top_n)
+
+    def reports(self, top_n=5):
+        """
+        返回 {产品ID: 报告}，报告结构与 generate_analysis_report 相同
+        """
+        reports = {}
+        for product_id in self.products():
+            statistics = self.review_counts.loc[product_id]
+            reports[product_id] = empty_report()
+            reports[product_id]['statistics'] = {
+                '总评论数': int(statistics.sum()),
+                '正面评论数': int(statistics.get('正面', 0)),
+                '负面评论数': int(statistics.get('负面', 0))
+            }
+        top = self.top_words(top_n)
+        for (product_id, sentiment, category), group in top.groupby(['product_id', 'sentiment', 'category'],
+                                                                    sort=False):
+            reports[product_id][ASPECTS[sentiment]][category] = [
+                {"特征词": word, "出现次数": int(count)} for word, count in zip(group['word'], group['count'])
+            ]
+        return reports
+
+    def scores(self, categories, top_n=5):
+        """
+        各产品的类别评分，规则与 evaluate_product_features_by_category 相同：
+        只统计前 top_n 特征词，(好评 - 差评) / (好评 + 差评) * 9.4 截断到 1-10，无评价的类别记 5 分
+
+        返回:
+        {产品ID: {类别: 分数}}
+        """
+        categories = list(categories)
+        products = self.products()
+        totals = (self.top_words(top_n)
+                  .groupby(['product_id', 'category', 'sentiment'])['count'].sum()
+                  .unstack('sentiment'))
+        index = pd.MultiIndex.from_product([products, categories], names=['product_id', 'category'])
+        totals = totals.reindex(index=index, columns=list(ASPECTS)).fillna(0)
+        positive_total = totals['正面'].to_numpy(dtype=float)
+        negative_total = totals['负面'].to_numpy(dtype=float)
+        total = positive_total + negative_total
+        ratio = np.divide(positive_total - negative_total, total, out=np.zeros_like(total), where=total > 0)
+        raw = np.minimum(10, ratio * 9.4)
+
+        scores = {product_id: {} for product_id in products}
+        for (product_id, category), t, r in zip(index, total, raw):
+            # 保持与逐产品计算相同的取值类型：无评价记整数5，下限截断为整数1，其余为浮点数
+            if t == 0:
+                score = 5
+            elif r <= 1:
+                score = 1
+            else:
+                score = float(r)
+            scores[product_id][category] = score
+        return scores
@@ -0,0 +1,245 @@
+# frontier.py
+"""
+爬取任务队列（crawl frontier）
+jd.py（商品详情）、jdcomments.py（评论）和 jdshop.py（搜索）共用一个本地 SQLite 文件，
+每个任务 (类型, 键) 记录状态、尝试次数、最近错误、下次可执行时间和结果内容的校验和：
+  pending - 等待执行（新任务，或失败后等待退避结束）
+  leased  - 已被某个工作线程/进程领取，租约到期未完成时可被重新领取（进程中途退出的情况）
+  done    - 已完成
+  failed  - 失败次数达到上限，不再自动重试（reset() 后重新排队）
+搜索得到的商品ID直接加入详情和评论任务；“还剩什么”只按索引计数，不扫描输出目录
+直接运行本文件打印各类任务的统计，--reset 把已放弃（或指定状态）的任务重新排队
+"""
+
+import time
+import argparse
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+
+DEFAULT_FRONTIER_PATH = 'crawl_frontier.sqlite'
+# 任务类型：搜索关键词（jdshop.py）、商品详情（jd.py）、商品评论（jdcomments.py）
+SEARCH_TASK = 'search'
+DETAIL_TASK = 'detail'
+COMMENTS_TASK = 'comments'
+DEFAULT_MAX_ATTEMPTS = 5
+# 第 n 次失败后等待 BASE_DELAY * 2^(n-1) 秒再重试，最长 MAX_DELAY 秒
+DEFAULT_BASE_DELAY = 60
+DEFAULT_MAX_DELAY = 6 * 3600
+# 租约时长：单个任务正常应在此时间内完成
+DEFAULT_LEASE_SECONDS = 600
+# 租约到期未完成（进程中途退出或卡住）时记录的错误
+LEASE_EXPIRED_ERROR = '租约过期（执行中断或超时）'
+# SQLite 单条语句的参数个数上限较小，批量写入按此大小分段
+_QUERY_CHUNK = 500
+
+
+def content_checksum(content):
+    """结果内容的 sha1，用于判断重新爬取后内容是否变化"""
+    if not isinstance(content, bytes):
+        content = str(content).encode('utf-8')
+    return hashlib.sha1(content).hexdigest()
+
+
+class Frontier:
+    """
+    基于 SQLite 的任务队列；同一进程内的多个标签页线程共用一个连接（加锁），
+    多个爬虫进程同时使用同一文件时依靠 WAL 和 BEGIN IMMEDIATE 保证领取不重复
+    """
+
+    def __init__(self, path=DEFAULT_FRONTIER_PATH, max_attempts=DEFAULT_MAX_ATTEMPTS, base_delay=DEFAULT_BASE_DELAY,
+                 max_delay=DEFAULT_MAX_DELAY, lease_seconds=DEFAULT_LEASE_SECONDS):
+        self.path = path
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS tasks ('
+                          'kind TEXT NOT NULL, key TEXT NOT NULL, status TEXT NOT NULL, '
+                          'attempts INTEGER NOT NULL DEFAULT 0, last_error TEXT, '
+                          'next_eligible REAL NOT NULL DEFAULT 0, lease_until REAL, checksum TEXT, '
+                          'updated_at REAL NOT NULL, PRIMARY KEY (kind, key))')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS tasks_queue ON tasks(kind, status, next_eligible)')
+
+    @contextmanager
+    def _transaction(self):
+        # IMMEDIATE 在读之前就取得写锁，避免两个进程领取到同一个任务
+        with self._lock:
+            self.conn.execute('BEGIN IMMEDIATE')
+            try:
+                yield self.conn
+            except BaseException:
+                self.conn.execute('ROLLBACK')
+                raise
+            self.conn.execute('COMMIT')
+
+    def add(self, kind, keys):
+        """
+        加入任务，已存在的任务保持原状态
+
+        返回:
+        本次新加入的键列表
+        """
+        keys = list(dict.fromkeys(keys))
+        now = time.time()
+        added = []
+        with self._transaction() as conn:
+            for i in range(0, len(keys), _QUERY_CHUNK):
+                chunk = keys[i:i + _QUERY_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                existing = {key for key, in conn.execute(
+                    f'SELECT key FROM tasks WHERE kind = ? AND key IN ({placeholders})', [kind] + chunk)}
+                new_keys = [key for key in chunk if key not in existing]
+                conn.executemany('INSERT INTO tasks (kind, key, status, updated_at) VALUES (?, ?, ?, ?)',
+                                 [(kind, key, 'pending', now) for key in new_keys])
+                added.extend(new_keys)
+        return added
+
+    def mark_done(self, kind, keys):
+        """把任务直接记为完成（如引入队列前已有输出文件的商品），不计尝试次数"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.executemany("UPDATE tasks SET status = 'done', lease_until = NULL, updated_at = ? "
+                             "WHERE kind = ? AND key = ?", [(now, kind, key) for key in keys])
+
+    def lease(self, kind, limit=1):
+        """
+        领取可执行的任务：到期的 pending 任务，以及租约已过期的 leased 任务；按可执行时间先后
+        租约过期也算一次失败：已用完尝试次数的过期任务标记为 failed，不再领取
+
+        返回:
+        领取到的键列表，没有可执行的任务时为空
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("UPDATE tasks SET status = 'failed', last_error = ?, lease_until = NULL, updated_at = ? "
+                         "WHERE kind = ? AND status = 'leased' AND lease_until < ? AND attempts >= ?",
+                         (LEASE_EXPIRED_ERROR, now, kind, now, self.max_attempts))
+            conn.execute("UPDATE tasks SET last_error = ? WHERE kind = ? AND status = 'leased' AND lease_until < ?",
+                         (LEASE_EXPIRED_ERROR, kind, now))
+            keys = [key for key, in conn.execute(
+                "SELECT key FROM tasks WHERE kind = ? AND ("
+                "(status = 'pending' AND next_eligible <= ?) OR (status = 'leased' AND lease_until < ?)) "
+                "ORDER BY next_eligible, rowid LIMIT ?", (kind, now, now, limit))]
+            conn.executemany("UPDATE tasks SET status = 'leased', attempts = attempts + 1, lease_until = ?, "
+                             "updated_at = ? WHERE kind = ? AND key = ?",
+                             [(now + self.lease_seconds, now, kind, key) for key in keys])
+        return keys
+
+    def leased(self, kind):
+        """逐个领取任务的生成器，没有可执行的任务（全部完成或都在退避中）时结束"""
+        while True:
+            keys = self.lease(kind, 1)
+            if not keys:
+                return
+            yield keys[0]
+
+    def complete(self, kind, key, checksum=None):
+        """
+        记录任务成功
+
+        返回:
+        结果内容与上次完成时是否不同（首次完成或未给出校验和时为 True）
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute('SELECT checksum FROM tasks WHERE kind = ? AND key = ?', (kind, key)).fetchone()
+            conn.execute("UPDATE tasks SET status = 'done', last_error = NULL, lease_until = NULL, checksum = ?, "
+                         "updated_at = ? WHERE kind = ? AND key = ?", (checksum, now, kind, key))
+        return checksum is None or row is None or row[0] != checksum
+
+    def fail(self, kind, key, error):
+        """
+        记录任务失败；未达到尝试上限时按指数退避重新排队，否则标记为 failed
+
+        返回:
+        是否还会重试
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute('SELECT attempts FROM tasks WHERE kind = ? AND key = ?', (kind, key)).fetchone()
+            attempts = row[0] if row else 0
+            retry = attempts < self.max_attempts
+            delay = min(self.max_delay, self.base_delay * 2 ** max(attempts - 1, 0))
+            conn.execute('UPDATE tasks SET status = ?, last_error = ?, next_eligible = ?, lease_until = NULL, '
+                         'updated_at = ? WHERE kind = ? AND key = ?',
+                         ('pending' if retry else 'failed', str(error), now + delay, now, kind, key))
+        return retry
+
+    @contextmanager
+    def attempt(self, kind, key):
+        """包住一次任务执行，未捕获的异常记为失败后继续向外抛出"""
+        try:
+            yield
+        except Exception as e:
+            self.fail(kind, key, e)
+            raise
+
+    def reset(self, kind, status='failed'):
+        """把某状态的任务重新排队（清零尝试次数），返回重置的任务数"""
+        with self._transaction() as conn:
+            return conn.execute("UPDATE tasks SET status = 'pending', attempts = 0, next_eligible = 0, "
+                                "lease_until = NULL, updated_at = ? WHERE kind = ? AND status = ?",
+                                (time.time(), kind, status)).rowcount
+
+    def remaining(self, kind):
+        """
+        返回:
+        {'ready': 现在可执行, 'waiting': 退避中, 'leased': 执行中, 'done': 已完成, 'failed': 已放弃}
+        """
+        now = time.time()
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT CASE WHEN status = 'pending' AND next_eligible <= ? THEN 'ready' "
+                "WHEN status = 'pending' THEN 'waiting' "
+                "WHEN status = 'leased' AND lease_until < ? "
+                "THEN (CASE WHEN attempts >= ? THEN 'failed' ELSE 'ready' END) "
+                "ELSE status END AS state, COUNT(*) "
+                "FROM tasks WHERE kind = ? GROUP BY state", (now, now, self.max_attempts, kind)).fetchall()
+        counts = dict.fromkeys(('ready', 'waiting', 'leased', 'done', 'failed'), 0)
+        counts.update(rows)
+        return counts
+
+    def errors(self, kind, limit=20):
+        """最近失败的任务：[(键, 尝试次数, 状态, 最近错误)]"""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT key, attempts, status, last_error FROM tasks WHERE kind = ? AND last_error IS NOT NULL "
+                "AND status != 'done' ORDER BY updated_at DESC LIMIT ?", (kind, limit)).fetchall()
+
+    def kinds(self):
+        with self._lock:
+            return [kind for kind, in self.conn.execute('SELECT DISTINCT kind FROM tasks ORDER BY kind')]
+
+    def print_summary(self, kind):
+        counts = self.remaining(kind)
+        print(f"[{kind}] 可执行 {counts['ready']}，退避中 {counts['waiting']}，执行中 {counts['leased']}，"
+              f"已完成 {counts['done']}，已放弃 {counts['failed']}")
+
+    def close(self):
+        self.conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='查看或重置爬取任务队列')
+    parser.add_argument('--path', default=DEFAULT_FRONTIER_PATH, help='任务队列文件')
+    parser.add_argument('--reset', metavar='KIND', help='把该类型中指定状态的任务重新排队')
+    parser.add_argument('--status', default='failed', help='--reset 的状态，默认 failed；done 表示全部重新爬取')
+    args = parser.parse_args()
+
+    frontier = Frontier(args.path)
+    if args.reset:
+        print(f"[{args.reset}] 重新排队 {frontier.reset(args.reset, args.status)} 个任务")
+    for kind in frontier.kinds():
+        frontier.print_summary(kind)
+        for key, attempts, status, error in frontier.errors(kind, limit=5):
+            print(f"    {key}（{status}，已尝试 {attempts} 次）: {error}")
+
+
+if __name__ == '__main__':
+    main()
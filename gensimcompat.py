@@ -0,0 +1,23 @@
+# gensimcompat.py
+"""
+gensim 的延迟导入与兼容补丁
+lda.py、ldacache.py、ldaglobal.py 共用，只在实际建语料或训练模型时付出导入开销
+"""
+
+
+def patch_scipy():
+    """新版 scipy 移除了 gensim 依赖的 scipy.linalg.triu，导入 gensim 前补上"""
+    import scipy.linalg
+    if not hasattr(scipy.linalg, 'triu'):
+        from scipy.linalg._basic import triu
+        scipy.linalg.triu = triu
+
+
+def import_gensim():
+    """
+    返回:
+    (gensim.corpora, gensim.models)
+    """
+    patch_scipy()
+    from gensim import corpora, models
+    return corpora, models
@@ -2,11 +2,23 @@ from DrissionPage import ChromiumPage, ChromiumOptions
 import os
 import time
 import csv
+from functools import partial
+
+from frontier import Frontier, content_checksum, DETAIL_TASK
+from metrics import LatencyMetrics
+from tabpool import TabPool
 
 # 常量配置
 CSV_INPUT = 'jdnew_products.csv'  # 存储商品 ID 的 CSV 文件
 CHROME_PATH = r"C:\Program Files\Google\Chrome\Application\chrome.exe"
 SAVE_DIR = r'C:\Users\MI\PycharmProjects\pythonProject2\jdgoodshop1'  # 修改为 shop 目录
+TABS = 1  # 并发标签页数；1 为单标签页逐个爬取
+READY_TIMEOUT = 15  # 等待页面就绪的最长秒数
+READY_METRICS_PATH = 'jd_ready_metrics.json'  # 页面就绪延迟报告（置空则不写出）
+BLOCKED_URL = 'https://www.jd.com/?from=pc_item&reason=403'
+FRONTIER_PATH = 'crawl_frontier.sqlite'  # 与 jdcomments.py、jdshop.py 共用的任务队列
+
+ready_metrics = LatencyMetrics('jd_detail')
 
 def setup_browser():
     co = ChromiumOptions()
@@ -14,10 +26,13 @@ def setup_browser():
 
 
     page = ChromiumPage(co)
-    # 伪装 webdriver
-    page.run_js("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+    hide_webdriver(page)
     return page
 
+def hide_webdriver(tab):
+    # 伪装 webdriver
+    tab.run_js("Object.defineProperty(navigator, 'webdriver', {get: () => undefined})")
+
 def read_product_ids(path):
     ids = []
     with open(path, 'r', encoding='utf-8-sig') as f:
@@ -41,23 +56,25 @@ def remove_after_sale_info(text):
 
 def get_product_detail_text(page, product_id):
     url = f'https://item.jd.com/{product_id}.html'
+    start = time.perf_counter()
     page.get(url)
-    time.sleep(3)  # 等待页面加载
-
-    current_url = page.url
-    if current_url == 'https://www.jd.com/?from=pc_item&reason=403':
-        print(f"[{product_id}] 跳转到错误页面，可能被限制或商品不存在，跳过。")
-        return None
 
     try:
+        # 好评率元素出现即视为就绪，不再固定等待；跳转到错误页时等到超时后按地址判断
+        applause_ele = None if page.url == BLOCKED_URL else page.ele('.applause-rate', timeout=READY_TIMEOUT)
+        if page.url == BLOCKED_URL:
+            print(f"[{product_id}] 跳转到错误页面，可能被限制或商品不存在，跳过。")
+            return None
+
         # 提取好评率文本
-        applause_ele = page.ele('.applause-rate')
         if applause_ele:
+            ready_metrics.observe('detail', time.perf_counter() - start)
             applause_text = applause_ele.text
             applause_text = applause_text.replace('\n', '').strip()
             print(f"[{product_id}] 获取到好评率：{applause_text}")
             return applause_text
         else:
+            ready_metrics.timeout('detail')
             print(f"[{product_id}] 页面中未找到好评率元素")
             return None
     except Exception as e:
@@ -76,19 +93,42 @@ def save_detail_text(text, product_id):
         f.write(text)
     print(f"[{product_id}] 商品详情已保存到 {path}")
 
+def scrape_product(page, product_id, frontier):
+    print(f"\n正在爬取商品 {product_id} 的详情...")
+    with frontier.attempt(DETAIL_TASK, product_id):
+        detail_text = get_product_detail_text(page, product_id)
+        save_detail_text(detail_text, product_id)
+        if detail_text:
+            frontier.complete(DETAIL_TASK, product_id, content_checksum(detail_text))
+        elif page.url == BLOCKED_URL:
+            frontier.fail(DETAIL_TASK, product_id, '跳转到403错误页面')
+        else:
+            frontier.fail(DETAIL_TASK, product_id, '未获取到好评率')
+
 def main():
     product_ids = read_product_ids(CSV_INPUT)
     print(f"读取到商品ID数量：{len(product_ids)}")
+    frontier = Frontier(FRONTIER_PATH)
+    # 首次加入队列的商品若已有输出文件（引入任务队列之前爬取的），直接记为完成
+    new_ids = frontier.add(DETAIL_TASK, product_ids)
+    frontier.mark_done(DETAIL_TASK, [product_id for product_id in new_ids if has_been_scraped(product_id)])
+    frontier.print_summary(DETAIL_TASK)
     page = setup_browser()
 
-    for product_id in product_ids:
-        if has_been_scraped(product_id):
-            print(f"[{product_id}] 已爬取，跳过")
-            continue
+    # 逐个领取可执行的任务：新商品、租约过期的、以及退避时间已到的失败商品
+    task = partial(scrape_product, frontier=frontier)
+    if TABS > 1:
+        with TabPool(page, TABS, setup_tab=hide_webdriver) as pool:
+            pool.crawl(frontier.leased(DETAIL_TASK), task, on_skipped=partial(frontier.fail, DETAIL_TASK))
+    else:
+        for product_id in frontier.leased(DETAIL_TASK):
+            task(page, product_id)
 
-        print(f"\n正在爬取商品 {product_id} 的详情...")
-        detail_text = get_product_detail_text(page, product_id)
-        save_detail_text(detail_text, product_id)
+    frontier.print_summary(DETAIL_TASK)
+
+    ready_metrics.print_summary()
+    if READY_METRICS_PATH:
+        ready_metrics.export_json(READY_METRICS_PATH)
 
 if __name__ == '__main__':
     main()
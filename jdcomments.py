@@ -1,15 +1,35 @@
 from DrissionPage import ChromiumPage, ChromiumOptions
 import time
-import json
 import csv
 import os
+import hashlib
 from DrissionPage._units.actions import Actions
-import random
+from functools import partial
+from commentsink import CommentSink
+from frontier import Frontier, content_checksum, COMMENTS_TASK
+from metrics import LatencyMetrics
+from reviewio import iter_reviews
+from reviewstore import write_product
+from tabpool import TabPool
 # 常量配置
 CSV_INPUT = 'jdnew_products.csv'  # 存储商品 ID 的 CSV 文件      # 存储评论的目录
 COOKIE_PATH = 'jd11yy.json'
 CHROME_PATH = r"C:\Program Files\Google\Chrome\Application\chrome.exe"
 SAVE_DIR = r'C:\Users\MI\PycharmProjects\pythonProject2\jd'
+STORE_DIR = r'C:\Users\MI\PycharmProjects\pythonProject2\review_store'  # Parquet 评论库（置空则不写入）
+EXPORT_CSV = False  # 是否额外从 JSON Lines 文件导出每个商品的 CSV（内容重复，默认关闭）
+TABS = 1  # 并发标签页数；1 为单标签页逐个爬取
+READY_TIMEOUT = 15  # 等待商品页元素出现的最长秒数
+LISTEN_TIMEOUT = 15  # 点击或滚动后等待评论接口响应的最长秒数
+READY_METRICS_PATH = 'jdcomments_ready_metrics.json'  # 页面就绪延迟报告（置空则不写出）
+FRONTIER_PATH = 'crawl_frontier.sqlite'  # 与 jd.py、jdshop.py 共用的任务队列
+# 增量刷新：重新爬取已完成的商品，只写入不早于上次爬到的最新评论日期的新评论（已有评论按身份去重），与原文件合并；
+# 列表按推荐排序，仍靠重复页和报告总数停止翻页，按日期过滤只省去写入
+INCREMENTAL = False
+TOTAL_KEYS = ('allCnt', 'commentCount', 'totalCount')  # 评论接口响应中表示评论总数的字段
+COMMENT_PAGE_SIZE = 10  # 评论接口每页条数；不满一页说明列表已到底（收到更大的页时以实际条数为准）
+
+ready_metrics = LatencyMetrics('jd_comments')
 
 def setup_browser():
     co = ChromiumOptions()
@@ -28,32 +48,117 @@ def read_product_ids(path):
     return ids
 
 
-def get_comments(page, product_id):
+def comment_identity(comment):
+    """评论的身份：昵称 + 日期 + 内容 的哈希，用于跨页去重"""
+    key = f"{comment.get('name', '')}\0{comment.get('日期', '')}\0{comment.get('评论', '')}"
+    return hashlib.sha1(key.encode('utf-8')).digest()
+
+def reported_total(jd_data):
+    """评论接口响应中的评论总数（在 result 及各 floor 上按 TOTAL_KEYS 查找），找不到时返回 None"""
+    result = jd_data.get('result', {})
+    for container in [result] + [floor for floor in result.get('floors', []) if isinstance(floor, dict)]:
+        for key in TOTAL_KEYS:
+            value = container.get(key)
+            if isinstance(value, int) or (isinstance(value, str) and value.isdigit()):
+                return int(value)
+    return None
+
+def get_comments(page, product_id, sink, since=None):
+    """
+    逐页抓取评论，每页立即追加到 sink；续爬时断点及之前的页只翻过、不重复写入
+    （评论列表靠滚动加载，只能从第一页重新翻到断点）
+    出现以下情况时提前停止翻页：某页的评论在本次翻过的页中都出现过（昵称、日期、内容都相同，
+    接口反复返回同一页或已没有更多评论），或已保存的条数达到接口报告的总数
+    已保存过的评论（续爬断点前、增量刷新的原有评论）不重复写入，但不作为停止条件
+
+    参数:
+    since - 增量刷新时上次爬到的最新评论日期，早于该日期的评论不写入（同一时刻的已有评论由去重跳过）；
+            评论列表默认按推荐排序而非时间排序，按日期过滤掉的页不作为停止条件
+
+    返回:
+    是否正常结束翻页；已抓满报告的总数或上一页不满一页时，等待超时视为列表结束（翻到底后不再发出请求）；
+    出错、第一页就超时或重新滚动一次后仍超时时返回 False，已写入的页保留在断点中
+    """
     url = f'https://item.jd.com/{product_id}.html'
-    all_comments = []
+    stored = {comment_identity(comment) for comment in sink.read()}
+    # 本次翻过的各页评论，用于判断接口是否在重复返回
+    crawled = set()
+    total = None
+    page_size = COMMENT_PAGE_SIZE
+    last_page_size = 0
     try:
+        start = time.perf_counter()
         page.get(url)
-        time.sleep(random.uniform(0.5, 0.8))  # ✅ 随机等待 1-3 秒
+        # “全部评价”按钮出现即可点击，不再随机等待
+        all_btn = page.ele('css:.all-btn .arrow', timeout=READY_TIMEOUT)
+        if not all_btn:
+            ready_metrics.timeout('detail')
+            print(f"[{product_id}] 页面中未找到全部评价按钮")
+            return False
+        ready_metrics.observe('detail', time.perf_counter() - start)
         page.listen.start('client.action')
-        page.ele('css:.all-btn .arrow').click()
+        start = time.perf_counter()
+        all_btn.click()
         ac = Actions(page)
+        tab = None  # 评论列表容器，收到第一页后获取
 
         for page1 in range(1, 50):
-            r = page.listen.wait()
+            # 以捕获到评论接口响应作为该页就绪；列表到底后滚动不再发出请求，只能等到超时，
+            # 因此已抓满报告的总数或上一页不满一页时超时视为列表结束；
+            # 否则可能只是响应慢或被限流，再滚动一次，仍超时按中断处理，保留断点等待重试
+            r = page.listen.wait(timeout=LISTEN_TIMEOUT)
+            if not r:
+                ready_metrics.timeout('comments')
+                list_ended = page1 > 1 and (last_page_size < page_size or (
+                        total is not None and max(len(crawled), sink.count) >= total))
+                if page1 > 1 and not list_ended:
+                    print(f"[{product_id}] 第 {page1} 页评论等待超时，重新滚动一次")
+                    start = time.perf_counter()
+                    ac.scroll(delta_y=4000, on_ele=tab)
+                    r = page.listen.wait(timeout=LISTEN_TIMEOUT)
+                    if not r:
+                        ready_metrics.timeout('comments')
+                if not r:
+                    if list_ended:
+                        print(f"[{product_id}] 第 {page1} 页评论等待超时，评论列表已到底，停止翻页")
+                        break
+                    print(f"[{product_id}] 第 {page1} 页评论等待超时，按中断处理，保留断点")
+                    return False
+            ready_metrics.observe('comments', time.perf_counter() - start)
             jd_data = r.response.body
             print(jd_data)
+            if total is None:
+                total = reported_total(jd_data)
             comment_list = jd_data.get('result', {}).get('floors', [])[2].get('data', [])
             comments = extract_comments(comment_list)
-            all_comments.extend(comments)
-            tab = page.ele('css:div._rateListContainer_1ygkr_45')
+            identities = [comment_identity(comment) for comment in comments]
+            # 上一页条数用于判断列表是否到底；每页条数取见过的最大值
+            last_page_size = len(comments)
+            page_size = max(page_size, last_page_size)
+            if all(identity in crawled for identity in identities):
+                print(f"[{product_id}] 第 {page1} 页没有新评论，停止翻页")
+                break
+            crawled.update(identities)
+            if page1 > sink.page:
+                new_comments = []
+                for comment, identity in zip(comments, identities):
+                    if identity in stored or (since and comment['日期'] and comment['日期'] < since):
+                        continue
+                    stored.add(identity)
+                    new_comments.append(comment)
+                # 全部被过滤的页也记入断点，续爬时不再重复处理
+                sink.append_page(page1, new_comments)
+                if total is not None and sink.count >= total:
+                    print(f"[{product_id}] 已抓到全部 {total} 条评论，停止翻页")
+                    break
+            tab = page.ele('css:div._rateListContainer_1ygkr_45', timeout=READY_TIMEOUT)
+            start = time.perf_counter()
             ac.scroll(delta_y=4000, on_ele=tab)
 
-            time.sleep(random.uniform(1, 3))
-
-        return all_comments
+        return True
     except Exception as e:
         print(f"[{product_id}] 抓取评论失败：{e}")
-        return all_comments
+        return False
 
 def extract_comments(comment_list):
     comments = []
@@ -68,12 +173,11 @@ def extract_comments(comment_list):
         })
     return comments
 
-def save_to_json(data, product_id):
-    os.makedirs(SAVE_DIR, exist_ok=True)
-    path = os.path.join(SAVE_DIR, f'{product_id}.json')
-    with open(path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
-    print(f"[{product_id}] 已保存 JSON 到 {path}")
+def save_to_store(data, product_id):
+    if not STORE_DIR:
+        return
+    path = write_product(data, product_id, STORE_DIR)
+    print(f"[{product_id}] 已写入评论库 {path}")
 
 def save_to_csv(data, product_id):
     if not data:
@@ -103,26 +207,74 @@ def save_to_csv(data, product_id):
         writer.writerows(filtered_data)
     print(f"[{product_id}] 已保存 CSV 到 {path}")
 
+def has_been_scraped(product_id):
+    json_path = os.path.join(SAVE_DIR, f'{product_id}.json')
+    csv_path = os.path.join(SAVE_DIR, f'{product_id}.csv')
+    return os.path.exists(json_path) or os.path.exists(csv_path)
+
+def scrape_product(page, product_id, frontier):
+    print(f'\n正在爬取商品 {product_id} 的评论...')
+    sink = CommentSink(SAVE_DIR, product_id)
+    since = None
+    previous = 0
+    if INCREMENTAL and os.path.exists(sink.path):
+        # 原文件在本商品抓完前保持不变，续爬时得到相同的日期水位
+        existing = list(iter_reviews(sink.path))
+        previous = len(existing)
+        since = max((comment.get('日期') or '' for comment in existing), default='') or None
+        if not sink.page and not sink.count:
+            sink.seed(existing)
+        print(f"[{product_id}] 增量刷新：已有 {previous} 条评论，只抓取 {since} 及之后的新评论")
+    if sink.page:
+        print(f"[{product_id}] 从断点继续：已保存 {sink.page} 页、{sink.count} 条评论")
+    with frontier.attempt(COMMENTS_TASK, product_id):
+        try:
+            finished = get_comments(page, product_id, sink, since)
+        finally:
+            sink.close()
+        if not finished:
+            frontier.fail(COMMENTS_TASK, product_id, f'抓取中断，已保存到第 {sink.page} 页')
+            return
+        if not sink.count:
+            sink.discard()
+            print(f"[{product_id}] 没有抓到任何评论")
+            frontier.fail(COMMENTS_TASK, product_id, '没有抓到任何评论')
+            return
+        path = sink.finish()
+        print(f"[{product_id}] 已保存 {sink.count} 条评论（新增 {sink.count - previous} 条）到 {path}")
+        comments = sink.read()
+        save_to_store(comments, product_id)
+        if EXPORT_CSV:
+            save_to_csv(comments, product_id)
+        with open(path, 'rb') as f:
+            frontier.complete(COMMENTS_TASK, product_id, content_checksum(f.read()))
+
 def main():
     product_ids = read_product_ids(CSV_INPUT)
-    page = setup_browser()
     print(f"读取到商品ID数量：{len(product_ids)}")
+    frontier = Frontier(FRONTIER_PATH)
+    # 首次加入队列的商品若已有 JSON 或 CSV 文件（引入任务队列之前爬取的），直接记为完成
+    new_ids = frontier.add(COMMENTS_TASK, product_ids)
+    frontier.mark_done(COMMENTS_TASK, [product_id for product_id in new_ids if has_been_scraped(product_id)])
+    if INCREMENTAL:
+        print(f"增量刷新：{frontier.reset(COMMENTS_TASK, 'done')} 个已完成的商品重新排队")
+    frontier.print_summary(COMMENTS_TASK)
+    page = setup_browser()
 
-    for product_id in product_ids:
-        json_path = os.path.join(SAVE_DIR, f'{product_id}.json')
-        csv_path = os.path.join(SAVE_DIR, f'{product_id}.csv')
+    task = partial(scrape_product, frontier=frontier)
+    if TABS > 1:
+        # 每个标签页有各自的 listen 监听器，互不串包
+        with TabPool(page, TABS) as pool:
+            pool.crawl(frontier.leased(COMMENTS_TASK), task, on_skipped=partial(frontier.fail, COMMENTS_TASK))
+    else:
+        for product_id in frontier.leased(COMMENTS_TASK):
+            task(page, product_id)
 
-        if os.path.exists(json_path) or os.path.exists(csv_path):
-            print(f"[{product_id}] 已存在 JSON 或 CSV 文件，跳过该商品")
-            continue
+    frontier.print_summary(COMMENTS_TASK)
 
-        print(f'\n正在爬取商品 {product_id} 的评论...')
-        comments = get_comments(page, product_id)
-        if comments:
-            save_to_json(comments, product_id)
-            save_to_csv(comments, product_id)
-        else:
-            print(f"[{product_id}] 没有抓到任何评论")
+    ready_metrics.print_summary()
+    if READY_METRICS_PATH:
+        ready_metrics.export_json(READY_METRICS_PATH)
 
 if __name__ == '__main__':
     main()
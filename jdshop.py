@@ -1,9 +1,20 @@
 import os
 import time
 import csv
-from playwright.sync_api import sync_playwright
+from playwright.sync_api import sync_playwright, TimeoutError as PlaywrightTimeoutError
+
+from frontier import Frontier, content_checksum, SEARCH_TASK, DETAIL_TASK, COMMENTS_TASK
+from metrics import LatencyMetrics
 
 CTX_STORAGE = "jd1.json"
+SEARCH_KEYWORD = "无线千兆路由器"
+FRONTIER_PATH = 'crawl_frontier.sqlite'  # 与 jd.py、jdcomments.py 共用的任务队列
+READY_TIMEOUT_MS = 30000  # 等待商品列表出现的最长毫秒数
+IDLE_TIMEOUT_MS = 2000  # 商品列表出现后等待网络空闲（懒加载的价格、评价数）的最长毫秒数
+TURN_TIMEOUT_MS = 3000  # 翻页后等待网络空闲的最长毫秒数
+READY_METRICS_PATH = 'jdshop_ready_metrics.json'  # 页面就绪延迟报告（置空则不写出）
+
+ready_metrics = LatencyMetrics('jd_search')
 
 
 def extract_product_info(item):
@@ -26,9 +37,52 @@ def extract_product_info(item):
     }
 
 
+def wait_network_idle(page, page_type, start, timeout):
+    """等待网络空闲并记录就绪延迟；页面一直有轮询请求时不会空闲，超时只计数"""
+    try:
+        page.wait_for_load_state("networkidle", timeout=timeout)
+    except PlaywrightTimeoutError:
+        ready_metrics.timeout(page_type)
+        return False
+    ready_metrics.observe(page_type, time.perf_counter() - start)
+    return True
+
+
+def wait_search_results(page, start):
+    """
+    等待搜索结果就绪：商品列表出现，再等网络空闲或 IDLE_TIMEOUT_MS，替代固定等待
+
+    返回:
+    商品列表是否在 READY_TIMEOUT_MS 内出现
+    """
+    try:
+        page.wait_for_selector(".gl-item", timeout=READY_TIMEOUT_MS)
+    except PlaywrightTimeoutError:
+        ready_metrics.timeout('search')
+        return False
+    wait_network_idle(page, 'search', start, IDLE_TIMEOUT_MS)
+    return True
+
+
 def main():
-    search_url = "https://search.jd.com/Search?keyword=无线千兆路由器"
+    search_url = f"https://search.jd.com/Search?keyword={SEARCH_KEYWORD}"
+
+    # 关键词作为一个搜索任务：已完成或在失败退避中时不再重复搜索
+    frontier = Frontier(FRONTIER_PATH)
+    frontier.add(SEARCH_TASK, [SEARCH_KEYWORD])
+    if not frontier.lease(SEARCH_TASK):
+        frontier.print_summary(SEARCH_TASK)
+        print(f"关键词 {SEARCH_KEYWORD} 已搜索过或在等待重试，如需重新搜索运行: "
+              f"python frontier.py --reset {SEARCH_TASK} --status done")
+        return
 
+    # 搜索过程中的异常（如 Playwright 出错）记为失败并按退避重试，不会一直停在执行中
+    with frontier.attempt(SEARCH_TASK, SEARCH_KEYWORD):
+        search(frontier, search_url)
+
+
+def search(frontier, search_url):
+    """搜索关键词并逐页收集商品，结果写入 jd_products.csv，搜到的商品加入详情和评论任务"""
     with sync_playwright() as p:
         browser = p.chromium.launch(headless=False)
         context = None
@@ -50,16 +104,19 @@ def main():
 
         # 打开搜索页面
         page = context.new_page()
+        start = time.perf_counter()
         page.goto(search_url, wait_until="load")
-
-        time.sleep(5)  # 等页面加载（可根据网速调整）
         all_results = []
 
+        if not wait_search_results(page, start):
+            print("搜索页加载超时")
+            frontier.fail(SEARCH_TASK, SEARCH_KEYWORD, '搜索页加载超时')
+            browser.close()
+            return
+
         for page_index in range(100):  # 爬取3页
             print(f"开始爬取第 {page_index + 1} 页")
 
-
-            page.wait_for_selector(".gl-item", timeout=15000)
             items = page.query_selector_all(".gl-item")
             print(f"找到 {len(items)} 个商品")
 
@@ -70,20 +127,22 @@ def main():
 
              # 模拟右方向键翻页
             print("按右方向键翻页...")
+            start = time.perf_counter()
             page.keyboard.press("ArrowRight")
-            time.sleep(3)  # 等待页面跳转（点击后的加载）
+            wait_network_idle(page, 'page_turn', start, TURN_TIMEOUT_MS)  # 等待页面跳转（翻页后的加载）
 
             # 刷新页面
+            start = time.perf_counter()
             page.reload()
-            try:
-                page.wait_for_selector(".gl-item", timeout=30000)
-                time.sleep(2)  # 页面动画加载
-            except Exception as e:
-                print(f"第 {i + 1} 页后加载超时: {e}")
+            if not wait_search_results(page, start):
+                print(f"第 {page_index + 1} 页后加载超时")
                 break
 
 
         browser.close()
+        ready_metrics.print_summary()
+        if READY_METRICS_PATH:
+            ready_metrics.export_json(READY_METRICS_PATH)
 
         # 保存CSV
         if all_results:
@@ -95,6 +154,14 @@ def main():
 
             print("数据已保存到 jd_products.csv")
 
+            # 搜到的商品加入详情和评论任务，jd.py、jdcomments.py 直接从队列领取
+            product_ids = [info["商品ID"] for info in all_results if info["商品ID"] != "无ID"]
+            frontier.complete(SEARCH_TASK, SEARCH_KEYWORD, content_checksum(','.join(product_ids)))
+            for kind in (DETAIL_TASK, COMMENTS_TASK):
+                print(f"[{kind}] 新加入 {len(frontier.add(kind, product_ids))} 个商品")
+        else:
+            frontier.fail(SEARCH_TASK, SEARCH_KEYWORD, '没有搜索到商品')
+
 
 if __name__ == "__main__":
     main()
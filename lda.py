@@ -8,66 +8,173 @@
 """
 
 import os
-import json
 import csv
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+from functools import partial
 import numpy as np
-import pandas as pd
-import re
-import jieba
-import scipy.linalg
-if not hasattr(scipy.linalg, 'triu'):
-    from scipy.linalg._basic import triu
-    scipy.linalg.triu = triu
-
-from gensim import corpora, models
-import matplotlib.pyplot as plt
-from wordcloud import WordCloud
-import seaborn as sns
-import pyLDAvis
-import pyLDAvis.gensim_models as gensimvis
-
-# 复用原有系统的预处理函数
+from segcache import segmentation_version
+from manifest import Manifest, config_version
+from reviewio import iter_reviews
+from reviewstore import list_products, partition_file, iter_product_batches
+from preprocess import make_clean_pattern, clean_texts, segment_batch
+from metrics import StageMetrics, RunMetrics
+from segpool import SegmentPool, worker_pool, worker_context
+from ldacache import LdaArtifactCache
+from gensimcompat import import_gensim
+
+# 分词缓存文件（置空则不使用缓存）
+SEG_CACHE_PATH = 'seg_cache.sqlite'
+# 增量处理清单文件（置空则每次全量重建）
+MANIFEST_PATH = 'lda_manifest.json'
+# Parquet 评论库目录（置空则直接读取 jd/ 下的JSON文件）
+STORE_DIR = None
+# 只分析该日期之后的评论，如 '2024-01-01'（仅对评论库生效）
+SINCE = None
+# 分阶段计时报告（JSON）与 Prometheus textfile 路径（置空则不导出）
+METRICS_PATH = 'lda_metrics.json'
+PROM_PATH = None
+# 分词进程数（1 为在主进程分词；大于1时工作进程继承主进程已初始化的 jieba 词典）
+SEG_WORKERS = 1
+# 是否生成词云、饼图和热力图（只需要关键词时置为 False，绘图库不会被导入）
+VISUALIZE = True
+# 后台绘图进程数（0 为在分析流程中同步绘制）
+RENDER_WORKERS = 1
+# 是否生成 pyLDAvis 交互页面（耗时较长）
+PYLDAVIS = False
+# 并行训练的产品进程数（1 为串行，None 为CPU核数）
+LDA_WORKERS = 1
+# 全局进程数上限（None 为CPU核数）：产品进程数与每个 LdaMulticore 的进程数按此分配
+MAX_WORKERS = None
+# 评论数不少于该值的产品改用 LdaMulticore 训练（None 表示不使用）
+MULTICORE_MIN_REVIEWS = None
+# 模型随机种子，固定后串行、并行运行结果一致
+LDA_SEED = 42
+# 训练遍数
+LDA_PASSES = 15
+# 按一致性自动选择主题数的候选范围（None 表示固定为5个主题），如 range(2, 16)
+TOPIC_RANGE = None
+# 一致性指标：'u_mass' 只用词袋语料，速度快；'c_v' 与人工判断更接近，但需要滑动窗口统计，较慢
+COHERENCE = 'u_mass'
+# 连续多少个候选主题数的一致性没有超过当前最优值就停止搜索
+SWEEP_PATIENCE = 2
+# LDA 训练产物缓存目录（置空则不缓存）及总大小上限（MB）
+LDA_CACHE_DIR = 'lda_cache'
+LDA_CACHE_MAX_MB = 2048
+# 使用全量评论上的共享模型，各产品只做推断（见 ldaglobal.py）
+GLOBAL_MODEL = False
+
+# 复用原有系统的预处理函数（停用词表、jieba 词典在进程内只加载一次）
 # ----------------------------
-def load_stopwords(filepath='stopwords.txt'):
-    """加载停用词表"""
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return set([line.strip() for line in f])
-    except:
-        return set()
-
-def clean_text(text):
-    """文本清洗函数"""
-    if not isinstance(text, str):
-        return ""
-    emoji_pattern = re.compile(
-        r"[" u"\U0001F600-\U0001F64F" u"\U0001F300-\U0001F5FF" u"\U0001F680-\U0001F6FF" u"\U0001F1E0-\U0001F1FF" "]+",
-        flags=re.UNICODE)
-    text = emoji_pattern.sub(r'', text)
-    text = re.sub(r'[^\u4e00-\u9fa5，。！？、；："\'“”‘’（）《》【】]', '', text)
-    text = re.sub(r'[a-zA-Z0-9]', '', text)
-    text = re.sub(r'\s+', '', text)
-    return text.strip()
-
-def seg_text(text, use_stopwords=True, use_pos=False):
-    """分词函数"""
-    min_word_length = 1
-    stopwords = load_stopwords()
-    
-    if use_pos:
-        words = psg.cut(text)
-        if use_stopwords:
-            return [(w.word, w.flag) for w in words if w.word not in stopwords and len(w.word) >= min_word_length]
-        return [(w.word, w.flag) for w in words if len(w.word) >= min_word_length]
-    else:
-        words = jieba.cut(text)
-        if use_stopwords:
-            return [w for w in words if w not in stopwords and len(w) >= min_word_length]
-        return [w for w in words if len(w) >= min_word_length]
+# LDA 额外保留中文引号
+LDA_CLEAN_PATTERN = make_clean_pattern('，。！？、；："\'“”‘’（）《》【】')
 
 # LDA主题分析核心函数
 # ----------------------------
-def perform_lda_analysis(reviews, product_id, num_topics=5, num_keywords=10):
+def train_lda_model(corpus, dictionary, num_topics=5, multicore_workers=0, seed=LDA_SEED):
+    """
+    训练LDA模型
+
+    参数:
+    multicore_workers - 大于0时使用 LdaMulticore，另开该数量的进程并行计算；
+                        LdaMulticore 不支持 alpha='auto'，改用对称先验，且结果与进程调度有关，不保证逐位可复现
+    """
+    _, models = import_gensim()
+    if multicore_workers > 0:
+        return models.LdaMulticore(
+            corpus=corpus,
+            id2word=dictionary,
+            num_topics=num_topics,
+            random_state=seed,
+            passes=LDA_PASSES,
+            alpha='symmetric',
+            eta='auto',
+            workers=multicore_workers
+        )
+    return models.LdaModel(
+        corpus=corpus,
+        id2word=dictionary,
+        num_topics=num_topics,
+        random_state=seed,
+        passes=LDA_PASSES,
+        alpha='auto',
+        eta='auto'
+    )
+
+def _score_topic_count(corpus, dictionary, texts, num_topics, coherence=COHERENCE):
+    # 主题数搜索的单个任务：训练一个候选模型并计算一致性（可在工作进程中执行）
+    _, models = import_gensim()
+    lda_model = train_lda_model(corpus, dictionary, num_topics)
+    coherence_model = models.CoherenceModel(model=lda_model, corpus=corpus, dictionary=dictionary,
+                                            texts=texts if coherence != 'u_mass' else None, coherence=coherence,
+                                            processes=1)
+    return coherence_model.get_coherence(), lda_model
+
+# 主题数搜索工作进程共用的 (语料, 词典, 分词结果, 一致性指标)；每个进程只接收一次，任务只传主题数
+_sweep_data = None
+
+def _init_sweep(data):
+    global _sweep_data
+    _sweep_data = data
+
+def _score_candidate(num_topics):
+    corpus, dictionary, texts, coherence = _sweep_data
+    return _score_topic_count(corpus, dictionary, texts, num_topics, coherence)
+
+def _sweep_pool(workers, data):
+    """
+    创建主题数搜索的进程池，语料等共用数据只传给每个工作进程一次：
+    fork 模式下子进程直接继承主进程的 _sweep_data，spawn 模式下通过 initializer 传入
+    """
+    context = worker_context()
+    _init_sweep(data)
+    if context.get_start_method() == 'fork':
+        return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_sweep, initargs=(data,))
+
+def select_num_topics(corpus, dictionary, texts, candidates, coherence=COHERENCE, patience=SWEEP_PATIENCE,
+                      workers=1):
+    """
+    按一致性选择主题数
+
+    所有候选模型共用同一个词典和语料；候选主题数从小到大每次并行训练 workers 个，
+    连续 patience 个候选没有超过当前最优一致性即停止。是否停止只按从小到大的顺序判断，
+    并行时多算出的候选被丢弃，因此选出的主题数与 workers 无关
+
+    返回:
+    (最优主题数, 最优模型, {主题数: 一致性})
+    """
+    candidates = sorted(candidates)
+    scores = {}
+    best = None
+    since_best = 0
+    with ExitStack() as stack:
+        executor = None
+        if workers > 1:
+            # 进程池关闭后释放主进程中对本产品语料的引用
+            stack.callback(_init_sweep, None)
+            executor = stack.enter_context(_sweep_pool(workers, (corpus, dictionary, texts, coherence)))
+        for start in range(0, len(candidates), max(1, workers)):
+            wave = candidates[start:start + max(1, workers)]
+            if executor is not None:
+                results = list(executor.map(_score_candidate, wave))
+            else:
+                results = [_score_topic_count(corpus, dictionary, texts, k, coherence) for k in wave]
+            for k, (score, lda_model) in zip(wave, results):
+                scores[k] = score
+                if best is None or score > best[1]:
+                    best = (k, score, lda_model)
+                    since_best = 0
+                else:
+                    since_best += 1
+                if since_best >= patience:
+                    return best[0], best[2], scores
+    return best[0], best[2], scores
+
+def perform_lda_analysis(reviews, product_id, num_topics=5, num_keywords=10, metrics=None, seg_pool=None,
+                         visualize=True, multicore_workers=0, artifact_cache=None, pyldavis=False, render=None,
+                         topic_range=None, sweep_workers=1, topic_selection=None):
     """
     执行LDA主题分析并生成可视化结果
     
@@ -76,53 +183,142 @@ def perform_lda_analysis(reviews, product_id, num_topics=5, num_keywords=10):
     product_id - 产品ID
     num_topics - 主题数量 (默认5)
     num_keywords - 每个主题的关键词数量 (默认10)
+    metrics - StageMetrics，记录清洗、分词、建语料、训练、提取关键词和可视化各阶段耗时
+    seg_pool - SegmentPool，给定时用进程池分词
+    visualize - 是否生成可视化结果
+    pyldavis - 是否生成 pyLDAvis 交互页面
+    render - 接收绘图数据的回调（如提交到后台进程池）；None 表示在当前进程立即绘制
+    multicore_workers - 大于0时用 LdaMulticore 训练，见 train_lda_model
+    artifact_cache - LdaArtifactCache；分词结果与训练参数都未变化时直接加载词典、语料和模型
+    topic_range - 候选主题数；给定时忽略 num_topics，按一致性选择（见 select_num_topics）
+    sweep_workers - 主题数搜索的并行进程数
+    topic_selection - 字典，给定时写入选出的主题数 'num_topics' 与各候选的一致性 'scores'
     
     返回:
     topic_keywords - 主题关键词字典
     """
+    if metrics is None:
+        metrics = StageMetrics()
+    n = len(reviews)
+    corpora, _ = import_gensim()
+
     # 1. 数据预处理
-    cleaned_reviews = [clean_text(review) for review in reviews]
-    segmented_reviews = [seg_text(text, use_stopwords=True, use_pos=False) 
-                         for text in cleaned_reviews]
-    
-    # 2. 准备语料库
-    dictionary = corpora.Dictionary(segmented_reviews)
-    corpus = [dictionary.doc2bow(text) for text in segmented_reviews]
+    with metrics.stage('clean', n):
+        cleaned_reviews = clean_texts(reviews, LDA_CLEAN_PATTERN).tolist()
+    with metrics.stage('segment', n):
+        segment = seg_pool.segment if seg_pool is not None else segment_batch
+        segmented_reviews = segment(cleaned_reviews, use_stopwords=True, use_pos=False, cache_path=SEG_CACHE_PATH)
     
-    # 3. 训练LDA模型
-    lda_model = models.LdaModel(
-        corpus=corpus,
-        id2word=dictionary,
-        num_topics=num_topics,
-        random_state=42,
-        passes=15,
-        alpha='auto',
-        eta='auto'
-    )
+    cached = None
+    if artifact_cache is not None:
+        with metrics.stage('cache_load', n):
+            if topic_range:
+                params = {'topic_range': sorted(topic_range), 'coherence': COHERENCE, 'patience': SWEEP_PATIENCE,
+                          'passes': LDA_PASSES, 'seed': LDA_SEED}
+            else:
+                params = {'num_topics': num_topics, 'passes': LDA_PASSES, 'seed': LDA_SEED,
+                          'multicore_workers': multicore_workers}
+            cache_key = artifact_cache.make_key(segmented_reviews, params)
+            cached = artifact_cache.load(cache_key)
+    scores = {}
+    if cached is not None:
+        dictionary, corpus, lda_model, info = cached
+        scores = {int(k): v for k, v in info.get('scores', {}).items()}
+        metrics.count('lda_cache_hits')
+    else:
+        # 2. 准备语料库
+        with metrics.stage('corpus', n):
+            dictionary = corpora.Dictionary(segmented_reviews)
+            corpus = [dictionary.doc2bow(text) for text in segmented_reviews]
+        
+        # 3. 训练LDA模型（或按一致性搜索主题数，直接沿用最优候选模型）
+        if topic_range:
+            with metrics.stage('topic_sweep', n):
+                _, lda_model, scores = select_num_topics(corpus, dictionary, segmented_reviews, topic_range,
+                                                         workers=sweep_workers)
+        else:
+            with metrics.stage('train', n):
+                lda_model = train_lda_model(corpus, dictionary, num_topics, multicore_workers)
+        if artifact_cache is not None:
+            with metrics.stage('cache_save', n):
+                artifact_cache.save(cache_key, dictionary, corpus, lda_model, {'scores': scores})
+    num_topics = lda_model.num_topics
+    if topic_selection is not None:
+        topic_selection['num_topics'] = num_topics
+        topic_selection['scores'] = scores
     
     # 4. 提取主题关键词
-    topic_keywords = {}
-    for topic_id in range(num_topics):
-        topic_terms = lda_model.show_topic(topic_id, topn=num_keywords)
-        keywords = [term[0] for term in topic_terms]
-        topic_keywords[f"主题{topic_id+1}"] = keywords
+    with metrics.stage('keywords', n):
+        topic_keywords = {}
+        for topic_id in range(num_topics):
+            topic_terms = lda_model.show_topic(topic_id, topn=num_keywords)
+            keywords = [term[0] for term in topic_terms]
+            topic_keywords[f"主题{topic_id+1}"] = keywords
     
-    # 5. 创建可视化目录
-    output_dir = f"lda_results/{product_id}"
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # 6. 生成可视化结果
-    generate_visualizations(lda_model, corpus, dictionary, segmented_reviews, product_id, output_dir)
+    if visualize:
+        # 5. 一次计算评论-主题矩阵，整理绘图数据
+        with metrics.stage('doc_topics', n):
+            data = visualization_data(lda_model, corpus, dictionary, product_id, f"lda_results/{product_id}",
+                                      pyldavis)
+        
+        # 6. 生成可视化结果（或交给后台绘制）
+        if render is None:
+            with metrics.stage('visualize', n):
+                render_visualizations(data)
+        else:
+            render(data)
     
     return topic_keywords
 
-def generate_visualizations(lda_model, corpus, dictionary, texts, product_id, output_dir):
-    """生成LDA分析的可视化结果"""
-    num_topics = lda_model.num_topics
+def doc_topic_matrix(lda_model, corpus):
+    """
+    一次批量推断全部评论的主题分布
+
+    返回:
+    (评论数, 主题数) 的矩阵，每行和为1
+    """
+    corpus = list(corpus)
+    if not corpus:
+        return np.zeros((0, lda_model.num_topics))
+    gamma, _ = lda_model.inference(corpus)
+    return gamma / gamma.sum(axis=1, keepdims=True)
+
+def visualization_data(lda_model, corpus, dictionary, product_id, output_dir, pyldavis=False):
+    """
+    收集绘图所需的数据（均可序列化，可交给后台进程绘制）
+
+    参数:
+    pyldavis - 是否生成 pyLDAvis 交互页面；这里只附上模型、语料和词典，
+               耗时的 gensimvis.prepare 在绘图时（可能是后台进程）执行
+    """
+    corpus = list(corpus)
+    doc_topics = doc_topic_matrix(lda_model, corpus)
+    data = {
+        'product_id': product_id,
+        'output_dir': output_dir,
+        'topic_terms': [dict(lda_model.show_topic(topic_id, topn=20)) for topic_id in range(lda_model.num_topics)],
+        'topic_dist': doc_topics.mean(axis=0) if len(doc_topics) else np.zeros(lda_model.num_topics),
+        'heatmap': doc_topics[:50],  # 只显示前50条评论
+        'ldavis': None
+    }
+    if pyldavis:
+        data['ldavis'] = {'model': lda_model, 'corpus': corpus, 'dictionary': dictionary}
+    return data
+
+def render_visualizations(data):
+    """根据 visualization_data 的结果绘制词云、饼图、热力图和 pyLDAvis 页面"""
+    # 绘图库导入耗时较长，只在生成可视化时导入
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from wordcloud import WordCloud
+
+    product_id = data['product_id']
+    output_dir = data['output_dir']
+    num_topics = len(data['topic_terms'])
+    os.makedirs(output_dir, exist_ok=True)
     
     # 1. 主题词云
-    for topic_id in range(num_topics):
-        topic_terms = dict(lda_model.show_topic(topic_id, topn=20))
+    for topic_id, topic_terms in enumerate(data['topic_terms']):
         wordcloud = WordCloud(
             font_path='SimHei.ttf',  # 使用支持中文的字体
             width=800,
@@ -138,15 +334,8 @@ def generate_visualizations(lda_model, corpus, dictionary, texts, product_id, ou
         plt.close()
     
     # 2. 主题分布饼图
-    topic_dist = np.zeros(num_topics)
-    for doc in corpus:
-        doc_topics = lda_model.get_document_topics(doc, minimum_probability=0)
-        for topic, prob in doc_topics:
-            topic_dist[topic] += prob
-    
-    topic_dist /= len(corpus)
     plt.figure(figsize=(8, 8))
-    plt.pie(topic_dist, 
+    plt.pie(data['topic_dist'], 
             labels=[f'主题{i+1}' for i in range(num_topics)],
             autopct='%1.1f%%',
             startangle=90)
@@ -155,14 +344,8 @@ def generate_visualizations(lda_model, corpus, dictionary, texts, product_id, ou
     plt.close()
     
     # 3. 主题热力图
-    topic_matrix = np.zeros((len(corpus), num_topics))
-    for i, doc in enumerate(corpus):
-        doc_topics = lda_model.get_document_topics(doc, minimum_probability=0)
-        for topic, prob in doc_topics:
-            topic_matrix[i, topic] = prob
-    
     plt.figure(figsize=(12, 8))
-    sns.heatmap(topic_matrix[:50], cmap="YlGnBu")  # 只显示前50条评论
+    sns.heatmap(data['heatmap'], cmap="YlGnBu")
     plt.title(f'产品{product_id}评论-主题分布热力图')
     plt.xlabel('主题')
     plt.ylabel('评论序号')
@@ -170,57 +353,270 @@ def generate_visualizations(lda_model, corpus, dictionary, texts, product_id, ou
     plt.close()
     
     # 4. 交互式可视化
-    vis_data = gensimvis.prepare(lda_model, corpus, dictionary)
-    pyLDAvis.save_html(vis_data, f'{output_dir}/lda_visualization.html')
+    if data['ldavis'] is not None:
+        import pyLDAvis
+        import pyLDAvis.gensim_models as gensimvis
+        ldavis = data['ldavis']
+        prepared = gensimvis.prepare(ldavis['model'], ldavis['corpus'], ldavis['dictionary'])
+        pyLDAvis.save_html(prepared, f'{output_dir}/lda_visualization.html')
+
+def _render_timed(data):
+    # 后台绘图进程的入口，返回耗时供主进程计入 'render' 阶段
+    start = time.perf_counter()
+    render_visualizations(data)
+    return time.perf_counter() - start
+
+def generate_visualizations(lda_model, corpus, dictionary, texts, product_id, output_dir, pyldavis=False):
+    """生成LDA分析的可视化结果"""
+    render_visualizations(visualization_data(lda_model, corpus, dictionary, product_id, output_dir, pyldavis))
 
 # 主处理函数
 # ----------------------------
-def process_jd_folder(folder_path='jd', output_csv='lda_keywords.csv'):
+def lda_version(num_topics=5, num_keywords=10, since=None, multicore_min_reviews=None, topic_range=None):
+    """影响LDA结果的配置版本：分词词典、停用词、模型参数（含训练轮数与随机种子）与日期过滤条件"""
+    parts = [segmentation_version(), num_topics, num_keywords, since, ('passes', LDA_PASSES), ('seed', LDA_SEED)]
+    # 使用 LdaMulticore 的产品先验不同，阈值也影响结果；未启用时保持原版本号
+    if multicore_min_reviews:
+        parts.append(('multicore', multicore_min_reviews))
+    if topic_range:
+        parts.append(('topic_range', sorted(topic_range), COHERENCE, SWEEP_PATIENCE))
+    return config_version(*parts)
+
+def product_sources(folder_path='jd', store_dir=None):
+    """
+    列出待处理的产品
+
+    返回:
+    (names, paths, sources)：names 为各产品在清单中的名称（按名称排序），
+    paths 用于计算文件指纹，sources 为 read_product_reviews 读取评论的来源
+    """
+    if store_dir:
+        names = list_products(store_dir)
+        paths = {name: partition_file(store_dir, name) for name in names}
+        sources = dict(zip(names, names))
+    else:
+        names = sorted(f for f in os.listdir(folder_path) if f.endswith('.json'))
+        paths = {name: os.path.join(folder_path, name) for name in names}
+        sources = paths
+    return names, paths, sources
+
+def plan_workers(workers=1, max_workers=None):
+    """
+    按全局进程上限分配进程数
+
+    参数:
+    workers - 并行训练的产品进程数，None 为上限值
+    max_workers - 全局进程数上限，None 为CPU核数
+
+    返回:
+    (产品进程数, 每个 LdaMulticore 另开的进程数)，两者相乘不超过上限；
+    每个产品分不到额外进程时后者为 0，大产品也用 LdaModel 单进程训练
+    """
+    cap = max_workers or os.cpu_count() or 1
+    workers = max(1, min(workers or cap, cap))
+    return workers, max(0, cap // workers - 1)
+
+def read_product_reviews(source, store_dir=None, since=None):
+    """读取单个产品的评论文本：评论库只读取评论列，否则流式读取JSON文件"""
+    if store_dir:
+        return [review for batch in iter_product_batches(source, store_dir, columns=['评论'], since=since)
+                for review in batch['评论'].tolist()]
+    return [item['评论'] for item in iter_reviews(source)]
+
+def analyze_product(filename, source, store_dir=None, since=None, visualize=True, multicore_min_reviews=None,
+                    multicore_workers=1, seg_pool=None, artifact_cache=None, pyldavis=False, defer_render=False,
+                    topic_range=None, sweep_workers=1):
+    """
+    读取单个产品的评论并做LDA分析
+
+    参数:
+    defer_render - 为 True 时不在本进程绘图，绘图数据随结果返回
+    topic_range, sweep_workers - 按一致性选择主题数，见 perform_lda_analysis
+
+    返回:
+    (输出行, 计时 snapshot, 错误信息, 绘图数据列表)；输出行为 {'lda_keywords': 关键词行,
+    'topic_selection': 主题数选择行（未搜索主题数时为 None）}，出错时为 None；
+    异常不向外抛出，避免单个产品中断整批任务
+    """
+    product_id = os.path.splitext(filename)[0]
+    metrics = StageMetrics()
+    renders = []
+    selection = {}
+    try:
+        # 流式读取评论，只保留评论内容
+        start = time.perf_counter()
+        reviews = read_product_reviews(source, store_dir, since)
+        metrics.add('load', time.perf_counter() - start, len(reviews))
+        if not reviews and store_dir and since:
+            # 日期窗口内没有评论属于正常结果：写默认行并记入清单，不当作错误每次重试
+            rows = {'lda_keywords': [product_id] + ['暂无'] * 5,
+                    'topic_selection': [product_id, 0, '', ''] if topic_range else None}
+            return rows, metrics.snapshot(), None, renders
+
+        # 执行LDA分析，评论较多的产品用 LdaMulticore
+        use_multicore = bool(multicore_min_reviews) and len(reviews) >= multicore_min_reviews
+        topic_keywords = perform_lda_analysis(reviews, product_id, metrics=metrics, seg_pool=seg_pool,
+                                              visualize=visualize,
+                                              multicore_workers=multicore_workers if use_multicore else 0,
+                                              artifact_cache=artifact_cache, pyldavis=pyldavis,
+                                              render=renders.append if defer_render else None,
+                                              topic_range=topic_range, sweep_workers=sweep_workers,
+                                              topic_selection=selection)
+        keywords_list = [','.join(kw) for kw in topic_keywords.values()]
+        rows = {'lda_keywords': [product_id] + keywords_list, 'topic_selection': None}
+        if topic_range:
+            scores = selection['scores']
+            rows['topic_selection'] = [product_id, selection['num_topics'],
+                                       f"{scores.get(selection['num_topics'], float('nan')):.4f}",
+                                       ','.join(f'{k}:{v:.4f}' for k, v in sorted(scores.items()))]
+        return rows, metrics.snapshot(), None, renders
+    except Exception as e:
+        return None, metrics.snapshot(), str(e), renders
+
+def process_jd_folder(folder_path='jd', output_csv='lda_keywords.csv', manifest_path=None, store_dir=None,
+                      since=None, metrics_path=None, prom_path=None, seg_workers=1, visualize=True, workers=1,
+                      max_workers=None, multicore_min_reviews=None, cache_dir=None, cache_max_mb=LDA_CACHE_MAX_MB,
+                      render_workers=0, pyldavis=False, topic_range=None):
     """
     处理JD文件夹中的所有JSON文件
     
     参数:
     folder_path - 包含JSON评论文件的文件夹路径
     output_csv - 输出CSV文件路径
+    manifest_path - 增量处理清单路径；给定时只重新分析新增或变化的文件，
+                    未变化产品的关键词行从清单取回
+    store_dir - Parquet 评论库目录；给定时从评论库读取各产品（忽略 folder_path）
+    since - 只分析该日期（含）之后的评论，仅对评论库生效
+    metrics_path - 分阶段计时报告（JSON）输出路径，含整体与各产品明细
+    prom_path - Prometheus textfile 输出路径，只含整体指标
+    seg_workers - 分词进程数，大于1时整次运行共用一个分词进程池（仅串行训练时使用）
+    visualize - 是否为每个产品生成可视化结果
+    render_workers - 后台绘图进程数；大于0时主题提取不等待绘图，绘图在后台进程池中进行，
+                     为0时在分析流程中同步绘制
+    pyldavis - 是否生成 pyLDAvis 交互页面（耗时较长，默认不生成）
+    topic_range - 候选主题数；给定时各产品按一致性选择主题数，并行训练候选模型，
+                  选择结果写入 output_csv 同目录的 lda_topic_selection.csv
+    workers - 并行训练的产品进程数，1 为串行，None 为 max_workers；
+              结果按文件名顺序写入，与串行模式相同
+    max_workers - 全局进程数上限，None 为CPU核数，见 plan_workers
+    multicore_min_reviews - 评论数不少于该值的产品改用 LdaMulticore 训练，None 表示不使用
+    cache_dir - LDA 训练产物缓存目录；评论未变化的产品跳过建语料和训练，直接提取关键词和生成可视化
+    cache_max_mb - 缓存总大小上限（MB），运行结束时按最近使用时间淘汰
     """
+    run_metrics = RunMetrics('lda')
     # 创建输出目录
-    os.makedirs('lda_results', exist_ok=True)
+    if visualize:
+        os.makedirs('lda_results', exist_ok=True)
+
+    names, paths, sources = product_sources(folder_path, store_dir)
+    version = lda_version(since=since, multicore_min_reviews=multicore_min_reviews, topic_range=topic_range)
+    manifest = Manifest(manifest_path, version) if manifest_path else None
+    cached = {}
+    if manifest is not None:
+        manifest.prune(names)
+        for name in names:
+            rows = manifest.cached_rows(name, paths[name])
+            if rows is not None:
+                cached[name] = rows
+    pending = [name for name in names if name not in cached]
+    workers, multicore_workers = plan_workers(workers, max_workers)
+    # 主题数搜索与产品并行共用全局进程上限
+    sweep_workers = max(1, (max_workers or os.cpu_count() or 1) // workers)
+    artifact_cache = LdaArtifactCache(cache_dir, cache_max_mb * 1024 * 1024) if cache_dir else None
+    analyze = partial(analyze_product, store_dir=store_dir, since=since, visualize=visualize,
+                      multicore_min_reviews=multicore_min_reviews, multicore_workers=multicore_workers,
+                      artifact_cache=artifact_cache, pyldavis=pyldavis,
+                      defer_render=visualize and render_workers > 0, topic_range=topic_range,
+                      sweep_workers=sweep_workers)
     
     # 准备CSV输出文件
-    with open(output_csv, 'w', newline='', encoding='utf-8-sig') as csvfile:
+    with open(output_csv, 'w', newline='', encoding='utf-8-sig') as csvfile, ExitStack() as stack:
         writer = csv.writer(csvfile)
         # 写入表头: 产品ID + 各主题关键词
-        writer.writerow(['产品ID'] + [f'主题{i+1}关键词' for i in range(5)])
+        max_topics = max(topic_range) if topic_range else 5
+        writer.writerow(['产品ID'] + [f'主题{i+1}关键词' for i in range(max_topics)])
+
+        def write_keywords(row):
+            # 选出的主题数少于 max_topics 的产品补空单元格，各行列数与表头一致
+            writer.writerow(list(row) + [''] * (max_topics + 1 - len(row)))
+
+        if topic_range:
+            selection_csv = os.path.join(os.path.dirname(output_csv), 'lda_topic_selection.csv')
+            selection_file = stack.enter_context(open(selection_csv, 'w', newline='', encoding='utf-8-sig'))
+            selection_writer = csv.writer(selection_file)
+            selection_writer.writerow(['产品ID', '主题数', '一致性', '各主题数一致性'])
+        render_futures = []
+        if visualize and render_workers > 0:
+            render_pool = stack.enter_context(ProcessPoolExecutor(max_workers=render_workers))
+
+        if workers > 1 and len(pending) > 1:
+            # 工作进程继承主进程已初始化的 jieba 词典；map 按提交顺序返回结果
+            executor = stack.enter_context(worker_pool(min(workers, len(pending))))
+            results = executor.map(analyze, pending, [sources[name] for name in pending])
+        else:
+            seg_workers = min(seg_workers, max_workers or os.cpu_count() or 1)
+            seg_pool = stack.enter_context(SegmentPool(seg_workers)) if seg_workers > 1 else None
+            results = (analyze(name, sources[name], seg_pool=seg_pool) for name in pending)
         
-        # 遍历文件夹中的所有JSON文件
-        for filename in os.listdir(folder_path):
-            if filename.endswith('.json'):
-                product_id = os.path.splitext(filename)[0]
-                file_path = os.path.join(folder_path, filename)
-                
-                try:
-                    # 读取JSON文件
-                    with open(file_path, 'r', encoding='utf-8') as f:
-                        reviews_data = json.load(f)
-                    
-                    # 提取评论内容
-                    reviews = [item['评论'] for item in reviews_data]
-                    
-                    # 执行LDA分析
-                    topic_keywords = perform_lda_analysis(reviews, product_id)
-                    
-                    # 写入CSV文件
-                    keywords_list = [','.join(kw) for kw in topic_keywords.values()]
-                    writer.writerow([product_id] + keywords_list)
-                    
-                    print(f"成功处理产品: {product_id}")
-                    
-                except Exception as e:
-                    print(f"处理文件 {filename} 时出错: {str(e)}")
-    
+        # 遍历所有产品
+        for filename in names:
+            # 文件未变化时直接复用上次的结果
+            if filename in cached:
+                write_keywords(cached[filename]['lda_keywords'])
+                if topic_range:
+                    selection_writer.writerow(cached[filename]['topic_selection'])
+                continue
+
+            rows, snapshot, error, renders = next(results)
+            run_metrics.add_product(os.path.splitext(filename)[0], snapshot)
+            for data in renders:
+                render_futures.append((filename, render_pool.submit(_render_timed, data)))
+            if error is not None:
+                print(f"处理文件 {filename} 时出错: {error}")
+                if manifest is not None:
+                    manifest.discard(filename)
+                continue
+
+            # 写入CSV文件
+            with run_metrics.stage('csv_write'):
+                write_keywords(rows['lda_keywords'])
+                if topic_range:
+                    selection_writer.writerow(rows['topic_selection'])
+            if manifest is not None:
+                manifest.update(filename, paths[filename], rows)
+            print(f"成功处理产品: {rows['lda_keywords'][0]}")
+
+        # 等待后台绘图全部完成；绘图失败不影响已写出的关键词
+        for filename, future in render_futures:
+            try:
+                run_metrics.add('render', future.result())
+            except Exception as e:
+                print(f"绘制 {filename} 的可视化结果时出错: {str(e)}")
+
+    if manifest is not None:
+        manifest.save()
+    if artifact_cache is not None:
+        removed = artifact_cache.evict()
+        print(f"LDA缓存：命中 {run_metrics.counters.get('lda_cache_hits', 0)} 个产品，淘汰 {removed} 项")
     print(f"LDA分析完成! 结果保存在: {output_csv}")
 
+    run_metrics.print_summary()
+    if metrics_path:
+        run_metrics.export_json(metrics_path)
+    if prom_path:
+        run_metrics.export_prometheus(prom_path)
+
 # 主函数
 if __name__ == "__main__":
     # 设置JD文件夹路径和输出文件
-    process_jd_folder(folder_path='jd', output_csv='lda_keywords.csv')
\ No newline at end of file
+    if GLOBAL_MODEL:
+        from ldaglobal import process_jd_folder_global
+        process_jd_folder_global(folder_path='jd', output_csv='lda_keywords.csv', store_dir=STORE_DIR, since=SINCE,
+                                 metrics_path=METRICS_PATH)
+    else:
+        process_jd_folder(folder_path='jd', output_csv='lda_keywords.csv', manifest_path=MANIFEST_PATH,
+                          store_dir=STORE_DIR, since=SINCE, metrics_path=METRICS_PATH, prom_path=PROM_PATH,
+                          seg_workers=SEG_WORKERS, visualize=VISUALIZE, workers=LDA_WORKERS,
+                          max_workers=MAX_WORKERS, multicore_min_reviews=MULTICORE_MIN_REVIEWS,
+                          cache_dir=LDA_CACHE_DIR, cache_max_mb=LDA_CACHE_MAX_MB, render_workers=RENDER_WORKERS,
+                          pyldavis=PYLDAVIS, topic_range=TOPIC_RANGE)
\ No newline at end of file
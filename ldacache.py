@@ -0,0 +1,125 @@
+# ldacache.py
+"""
+LDA 训练产物缓存
+键：分词结果 + 主题数 + 训练参数 + gensim 版本 的哈希
+值：一个目录，内含 corpora.Dictionary、MmCorpus 语料、训练好的 LdaModel 和附加信息 info.json
+评论未变化的产品再次运行时直接加载，跳过建语料和训练；
+总大小超过上限时按最近使用时间淘汰（淘汰只在主进程一次运行结束时做，避免与并行的读取冲突）
+"""
+
+import os
+import json
+import shutil
+import hashlib
+
+from gensimcompat import import_gensim
+
+DEFAULT_CACHE_DIR = 'lda_cache'
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+_DICTIONARY_FILE = 'dictionary.gensim'
+_CORPUS_FILE = 'corpus.mm'
+_MODEL_FILE = 'model.gensim'
+_INFO_FILE = 'info.json'
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class LdaArtifactCache:
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def make_key(segmented_texts, params):
+        """
+        参数:
+        segmented_texts - 分词后的评论列表
+        params - 影响训练结果的参数字典（主题数、遍数、随机种子等）
+        """
+        import gensim
+        h = hashlib.sha1()
+        h.update(json.dumps({'params': params, 'gensim': gensim.__version__}, sort_keys=True).encode('utf-8'))
+        for words in segmented_texts:
+            h.update(json.dumps(words, ensure_ascii=False).encode('utf-8'))
+            h.update(b'\n')
+        return h.hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def load(self, key):
+        """
+        返回 (dictionary, corpus, model, info)，未命中或读取失败时返回 None
+        corpus 为 MmCorpus，按需从磁盘流式读取；info 为保存时附带的字典
+        """
+        entry = self._entry_dir(key)
+        if not os.path.isdir(entry):
+            return None
+        corpora, models = import_gensim()
+        try:
+            dictionary = corpora.Dictionary.load(os.path.join(entry, _DICTIONARY_FILE))
+            corpus = corpora.MmCorpus(os.path.join(entry, _CORPUS_FILE))
+            model = models.LdaModel.load(os.path.join(entry, _MODEL_FILE))
+            with open(os.path.join(entry, _INFO_FILE), 'r', encoding='utf-8') as f:
+                info = json.load(f)
+        except (OSError, ValueError, EOFError) as e:
+            print(f"读取LDA缓存 {key} 失败，将重新训练: {e}")
+            return None
+        # 目录修改时间作为最近使用时间
+        os.utime(entry)
+        return dictionary, corpus, model, info
+
+    def save(self, key, dictionary, corpus, model, info=None):
+        """
+        写入一个缓存项；先写临时目录再改名，并行写入同一键时保留先完成的一份
+
+        参数:
+        info - 随模型保存的附加信息（可 JSON 序列化），如主题数搜索的一致性得分
+        """
+        corpora, _ = import_gensim()
+        entry = self._entry_dir(key)
+        tmp_entry = f'{entry}.tmp-{os.getpid()}'
+        os.makedirs(tmp_entry, exist_ok=True)
+        try:
+            dictionary.save(os.path.join(tmp_entry, _DICTIONARY_FILE))
+            corpora.MmCorpus.serialize(os.path.join(tmp_entry, _CORPUS_FILE), corpus, id2word=dictionary)
+            model.save(os.path.join(tmp_entry, _MODEL_FILE))
+            with open(os.path.join(tmp_entry, _INFO_FILE), 'w', encoding='utf-8') as f:
+                json.dump(info or {}, f, ensure_ascii=False)
+            os.replace(tmp_entry, entry)
+        except OSError:
+            shutil.rmtree(tmp_entry, ignore_errors=True)
+
+    def evict(self):
+        """总大小超过 max_bytes 时删除最久未使用的缓存项，返回删除的项数"""
+        if not os.path.isdir(self.cache_dir):
+            return 0
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if not os.path.isdir(path):
+                continue
+            if '.tmp-' in name:
+                # 中断的写入留下的临时目录
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            entries.append((os.path.getmtime(path), _dir_size(path), path))
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total -= size
+            removed += 1
+        return removed
@@ -0,0 +1,344 @@
+# ldaglobal.py
+"""
+全量评论上的共享LDA模型
+在 jd/ 下全部产品的评论上训练一个词典和一个LDA模型并持久化，各产品只做推断：
+  1. lda_keywords.csv - 各产品权重最高的5个全局主题的关键词（格式与逐产品训练相同）
+  2. lda_product_topics.csv - 各产品在全部全局主题上的平均分布
+  3. <模型目录>/topics.csv - 全局主题关键词，各产品的主题可以直接比较
+再次运行时只把新出现的评论通过 LdaModel.update() 在线并入模型，不重新训练；
+词典在首次训练时确定，新评论中词典外的词被忽略，需要纳入新词时用 retrain=True 重新训练
+分词结果逐产品写入临时文件，训练、更新和推断都从该文件流式读取，内存中只保留评论哈希
+"""
+
+import os
+import csv
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+
+import numpy as np
+
+from lda import (SEG_CACHE_PATH, LDA_CLEAN_PATTERN, LDA_SEED, product_sources, read_product_reviews)
+from manifest import config_version
+from metrics import RunMetrics
+from preprocess import clean_texts, segment_batch
+from segcache import segmentation_version
+from gensimcompat import import_gensim
+
+DEFAULT_MODEL_DIR = 'lda_global'
+# 全局主题数与训练遍数
+GLOBAL_NUM_TOPICS = 20
+GLOBAL_PASSES = 5
+# 词典过滤：出现在少于 NO_BELOW 条评论、或超过 NO_ABOVE 比例评论中的词不参与建模
+NO_BELOW = 2
+NO_ABOVE = 0.5
+# lda_keywords.csv 中每个产品列出的主题数（与逐产品训练的列数相同）
+PRODUCT_TOPICS = 5
+# 在线更新时每次并入模型的评论条数
+UPDATE_BATCH = 10000
+
+
+def review_hashes(product_id, texts):
+    """评论的64位哈希（产品ID + 清洗后文本），用于判断评论是否已并入模型"""
+    return np.array([int.from_bytes(hashlib.blake2b(f'{product_id}\0{text}'.encode('utf-8'), digest_size=8).digest(),
+                                    'little') for text in texts], dtype=np.uint64)
+
+
+def global_version(num_topics=GLOBAL_NUM_TOPICS, passes=GLOBAL_PASSES, since=None):
+    """影响模型的配置版本；变化后已保存的模型作废，重新训练"""
+    return config_version(segmentation_version(), num_topics, passes, NO_BELOW, NO_ABOVE, LDA_SEED, since)
+
+
+class GlobalTopicModel:
+    """
+    持久化的全局词典与LDA模型
+
+    目录内容：dictionary.gensim、model.gensim（及 gensim 附带的数组文件）、
+    seen.npy（已并入模型的评论哈希，已排序）、meta.json（配置版本与统计）
+    """
+
+    def __init__(self, model_dir=DEFAULT_MODEL_DIR, version=''):
+        self.model_dir = model_dir
+        self.version = version
+        self.dictionary = None
+        self.model = None
+        self.seen = np.empty(0, dtype=np.uint64)
+        self.meta = {'version': version, 'documents': 0, 'updates': 0}
+
+    def _path(self, name):
+        return os.path.join(self.model_dir, name)
+
+    @classmethod
+    def load(cls, model_dir=DEFAULT_MODEL_DIR, version=''):
+        """加载已保存的模型；不存在或配置版本不一致时返回 None"""
+        try:
+            with open(os.path.join(model_dir, 'meta.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('version') != version:
+            print(f"全局模型 {model_dir} 的配置版本已变化，将重新训练")
+            return None
+        corpora, models = import_gensim()
+        instance = cls(model_dir, version)
+        instance.meta = meta
+        instance.dictionary = corpora.Dictionary.load(instance._path('dictionary.gensim'))
+        instance.model = models.LdaModel.load(instance._path('model.gensim'))
+        instance.seen = np.load(instance._path('seen.npy'))
+        return instance
+
+    def train(self, texts, num_topics=GLOBAL_NUM_TOPICS, passes=GLOBAL_PASSES):
+        """
+        在分词后的全部评论上建词典并训练模型
+
+        参数:
+        texts - 分词后的评论，可重复迭代（如 SegmentedSpill），训练时按遍数逐遍流式读取
+        """
+        corpora, models = import_gensim()
+        self.dictionary = corpora.Dictionary(texts)
+        self.dictionary.filter_extremes(no_below=NO_BELOW, no_above=NO_ABOVE, keep_n=None)
+        corpus = SpillCorpus(texts, self.dictionary)
+        self.model = models.LdaModel(
+            corpus=corpus,
+            id2word=self.dictionary,
+            num_topics=num_topics,
+            random_state=LDA_SEED,
+            passes=passes,
+            alpha='auto',
+            eta='auto'
+        )
+        self.meta['documents'] = len(corpus)
+
+    def update(self, texts):
+        """把新评论在线并入模型（词典不变）"""
+        corpus = [self.dictionary.doc2bow(text) for text in texts]
+        self.model.update(corpus)
+        self.meta['documents'] += len(corpus)
+        self.meta['updates'] += 1
+
+    def unseen(self, hashes):
+        """返回尚未并入模型的评论的布尔掩码"""
+        return ~np.isin(hashes, self.seen, assume_unique=False)
+
+    def mark_seen(self, hashes):
+        self.seen = np.union1d(self.seen, hashes)
+
+    def infer(self, texts):
+        """
+        推断每条评论的主题分布
+
+        返回:
+        (评论数, 主题数) 的矩阵，每行和为1
+        """
+        corpus = [self.dictionary.doc2bow(text) for text in texts]
+        gamma, _ = self.model.inference(corpus)
+        return gamma / gamma.sum(axis=1, keepdims=True)
+
+    def topic_keywords(self, topn=10):
+        return [[word for word, _ in self.model.show_topic(topic_id, topn=topn)]
+                for topic_id in range(self.model.num_topics)]
+
+    def save(self):
+        """
+        先写入临时目录，再用 os.replace 整体换入 model_dir；
+        中途失败时原模型保持完整，不会留下新旧文件混杂的目录
+        """
+        self.meta['saved_at'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        tmp_dir = f'{self.model_dir}.tmp-{os.getpid()}'
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+        try:
+            self.dictionary.save(os.path.join(tmp_dir, 'dictionary.gensim'))
+            self.model.save(os.path.join(tmp_dir, 'model.gensim'))
+            np.save(os.path.join(tmp_dir, 'seen.npy'), self.seen)
+            with open(os.path.join(tmp_dir, 'meta.json'), 'w', encoding='utf-8') as f:
+                json.dump(self.meta, f, ensure_ascii=False, indent=2)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+        # 目录不能直接替换非空目录：先把旧模型移开，换入新模型后再删除
+        old_dir = f'{self.model_dir}.old-{os.getpid()}'
+        if os.path.isdir(self.model_dir):
+            os.replace(self.model_dir, old_dir)
+        os.replace(tmp_dir, self.model_dir)
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+class SegmentedSpill:
+    """
+    逐产品暂存分词结果的临时文件（每行一个产品的 JSON），可以多次从头流式读取，
+    全部产品的分词结果不必同时放在内存中
+    """
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile('w+', encoding='utf-8')
+        self.documents = 0
+
+    def add(self, product_id, texts):
+        self._file.write(json.dumps([product_id, texts], ensure_ascii=False) + '\n')
+        self.documents += len(texts)
+
+    def products(self):
+        """逐个产生 (产品ID, 分词结果)"""
+        self._file.seek(0)
+        for line in self._file:
+            yield json.loads(line)
+
+    def __iter__(self):
+        # 逐条产生分词后的评论，作为训练语料时每一遍都重新从头读取
+        for _, texts in self.products():
+            yield from texts
+
+    def __len__(self):
+        return self.documents
+
+    def close(self):
+        self._file.close()
+
+
+class SpillCorpus:
+    """把 SegmentedSpill 中的评论按词典转换为词袋的流式语料，可重复迭代（多遍训练）"""
+
+    def __init__(self, spill, dictionary):
+        self.spill = spill
+        self.dictionary = dictionary
+
+    def __iter__(self):
+        for text in self.spill:
+            yield self.dictionary.doc2bow(text)
+
+    def __len__(self):
+        return len(self.spill)
+
+
+def _fit_global_model(spill, hashes, model_dir, num_topics, num_keywords, since, retrain, run_metrics):
+    """
+    训练或在线更新全局模型并保存
+
+    参数:
+    spill - 全部产品分词结果的 SegmentedSpill
+    hashes - {产品ID: 评论哈希}，与 spill 中的评论一一对应
+
+    返回:
+    (GlobalTopicModel, 各全局主题的关键词)
+    """
+    version = global_version(num_topics, GLOBAL_PASSES, since)
+    model = None if retrain else GlobalTopicModel.load(model_dir, version)
+    if model is None:
+        model = GlobalTopicModel(model_dir, version)
+        with run_metrics.stage('train', len(spill)):
+            model.train(spill, num_topics)
+        model.mark_seen(np.concatenate(list(hashes.values())))
+        print(f"全局模型训练完成：{len(spill)} 条评论，{num_topics} 个主题")
+    else:
+        # 新评论按 UPDATE_BATCH 条一批并入，不把全部新评论同时放在内存中
+        batch = []
+        new_hashes = []
+        added = 0
+
+        def flush():
+            with run_metrics.stage('update', len(batch)):
+                model.update(batch)
+            batch.clear()
+
+        for product_id, segmented in spill.products():
+            mask = model.unseen(hashes[product_id])
+            if not mask.any():
+                continue
+            new_hashes.append(hashes[product_id][mask])
+            for text, is_new in zip(segmented, mask):
+                if is_new:
+                    batch.append(text)
+                    if len(batch) >= UPDATE_BATCH:
+                        added += len(batch)
+                        flush()
+        if batch:
+            added += len(batch)
+            flush()
+        if new_hashes:
+            model.mark_seen(np.concatenate(new_hashes))
+        print(f"全局模型已加载，并入新评论 {added} 条")
+    model.save()
+    return model, model.topic_keywords(num_keywords)
+
+
+def process_jd_folder_global(folder_path='jd', output_csv='lda_keywords.csv', model_dir=DEFAULT_MODEL_DIR,
+                             num_topics=GLOBAL_NUM_TOPICS, num_keywords=10, store_dir=None, since=None,
+                             retrain=False, metrics_path=None):
+    """
+    用全局模型处理全部产品
+
+    参数:
+    model_dir - 模型保存目录；已有同配置的模型时只并入新评论
+    num_topics - 全局主题数
+    retrain - 忽略已保存的模型，重新建词典并训练
+    其余参数同 lda.process_jd_folder
+    """
+    run_metrics = RunMetrics('lda_global')
+    names, _, sources = product_sources(folder_path, store_dir)
+
+    # 1. 读取并分词全部产品的评论，分词结果写入临时文件，内存中只保留评论哈希
+    spill = SegmentedSpill()
+    hashes = {}
+    try:
+        for filename in names:
+            product_id = os.path.splitext(filename)[0]
+            try:
+                start = time.perf_counter()
+                reviews = read_product_reviews(sources[filename], store_dir, since)
+                run_metrics.add('load', time.perf_counter() - start, len(reviews))
+                with run_metrics.stage('clean', len(reviews)):
+                    cleaned = clean_texts(reviews, LDA_CLEAN_PATTERN).tolist()
+                with run_metrics.stage('segment', len(reviews)):
+                    segmented = segment_batch(cleaned, use_stopwords=True, use_pos=False, cache_path=SEG_CACHE_PATH)
+            except Exception as e:
+                print(f"处理文件 {filename} 时出错: {str(e)}")
+                continue
+            if not segmented:
+                print(f"产品 {product_id} 没有评论，跳过")
+                continue
+            spill.add(product_id, segmented)
+            hashes[product_id] = review_hashes(product_id, cleaned)
+
+        if not hashes:
+            print("没有可分析的评论")
+            return
+        # 2. 训练或在线更新全局模型
+        model, topic_words = _fit_global_model(spill, hashes, model_dir, num_topics, num_keywords, since, retrain,
+                                               run_metrics)
+
+        # 3. 推断各产品的主题分布并写出结果
+        num_topics = len(topic_words)
+        topics_csv = os.path.join(os.path.dirname(output_csv), 'lda_product_topics.csv')
+        with open(output_csv, 'w', newline='', encoding='utf-8-sig') as kcsv, \
+                open(topics_csv, 'w', newline='', encoding='utf-8-sig') as tcsv:
+            kwriter = csv.writer(kcsv)
+            twriter = csv.writer(tcsv)
+            kwriter.writerow(['产品ID'] + [f'主题{i+1}关键词' for i in range(PRODUCT_TOPICS)])
+            twriter.writerow(['产品ID'] + [f'全局主题{i+1}' for i in range(num_topics)])
+            for product_id, segmented in spill.products():
+                with run_metrics.stage('infer', len(segmented)):
+                    distribution = model.infer(segmented).mean(axis=0)
+                top_topics = np.argsort(-distribution, kind='stable')[:PRODUCT_TOPICS]
+                kwriter.writerow([product_id] + [','.join(topic_words[t]) for t in top_topics])
+                twriter.writerow([product_id] + [f'{p:.6f}' for p in distribution])
+                print(f"成功处理产品: {product_id}")
+    finally:
+        spill.close()
+
+    with open(os.path.join(model_dir, 'topics.csv'), 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.writer(f)
+        writer.writerow(['主题', '关键词'])
+        for topic_id, words in enumerate(topic_words):
+            writer.writerow([f'全局主题{topic_id+1}', ','.join(words)])
+
+    print(f"LDA分析完成! 结果保存在: {output_csv}、{topics_csv}")
+    run_metrics.print_summary()
+    if metrics_path:
+        run_metrics.export_json(metrics_path)
+
+
+if __name__ == '__main__':
+    process_jd_folder_global(folder_path='jd', output_csv='lda_keywords.csv', model_dir=DEFAULT_MODEL_DIR)
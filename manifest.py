@@ -0,0 +1,86 @@
+# manifest.py
+"""
+增量处理清单
+记录每个输入文件的大小、修改时间、内容哈希，以及它在各输出CSV中对应的行；
+再次运行时只重新计算新增或内容变化的文件，其余产品的输出行直接从清单取回合并
+"""
+
+import os
+import json
+import hashlib
+
+from segcache import file_digest
+
+
+def config_version(*parts):
+    """把影响输出结果的配置（词典版本、特征词典等）合成一个版本号，变化后清单整体失效"""
+    h = hashlib.sha1()
+    for part in parts:
+        h.update(json.dumps(part, ensure_ascii=False, sort_keys=True).encode('utf-8'))
+    return h.hexdigest()
+
+
+class Manifest:
+    def __init__(self, path, version=''):
+        self.path = path
+        self.version = version
+        self.entries = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                if data.get('version') == version:
+                    self.entries = data.get('files', {})
+                else:
+                    print(f"清单 {path} 的配置版本已变化，全部文件将重新处理")
+            except (OSError, ValueError) as e:
+                print(f"读取清单 {path} 失败，全部文件将重新处理: {e}")
+
+    @staticmethod
+    def fingerprint(file_path):
+        stat = os.stat(file_path)
+        return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+    def cached_rows(self, filename, file_path):
+        """
+        文件未变化时返回清单中记录的输出行，否则返回 None
+
+        大小和修改时间一致即视为未变化；不一致时再比较内容哈希，
+        内容相同（如仅被重新复制）则刷新时间戳并继续复用
+        """
+        entry = self.entries.get(filename)
+        if entry is None:
+            return None
+        fp = self.fingerprint(file_path)
+        if fp['size'] == entry['size'] and fp['mtime'] == entry['mtime']:
+            return entry['rows']
+        if fp['size'] == entry['size'] and file_digest(file_path) == entry['sha1']:
+            entry.update(fp)
+            return entry['rows']
+        return None
+
+    def update(self, filename, file_path, rows):
+        """记录文件的最新指纹及其输出行，rows 为 {输出名: 行}"""
+        entry = self.fingerprint(file_path)
+        entry['sha1'] = file_digest(file_path)
+        entry['rows'] = rows
+        self.entries[filename] = entry
+
+    def discard(self, filename):
+        self.entries.pop(filename, None)
+
+    def prune(self, filenames):
+        """删除输入目录中已不存在的文件记录"""
+        keep = set(filenames)
+        for filename in list(self.entries):
+            if filename not in keep:
+                del self.entries[filename]
+
+    def save(self):
+        if not self.path:
+            return
+        # 先写临时文件再替换，避免中途崩溃留下损坏的清单
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': self.version, 'files': self.entries}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
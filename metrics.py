@@ -0,0 +1,279 @@
+# metrics.py
+"""
+批处理流水线的分阶段计时
+记录每个阶段的耗时、调用次数和处理条数，按整次运行和单个产品两级汇总，
+导出为 JSON 运行报告和 Prometheus textfile（供 node_exporter 的 textfile collector 采集）
+计时只用 perf_counter 和字典累加，开销可忽略，生产环境可常开
+爬虫的页面就绪延迟用 LatencyMetrics 按页面类型记录为直方图
+"""
+
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+
+# 就绪延迟直方图的桶上界（秒）
+DEFAULT_LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 20, 30)
+
+
+class StageMetrics:
+    """单个作用域（一次运行或一个产品）内各阶段的累计值"""
+
+    def __init__(self):
+        # 阶段名 -> [耗时秒数, 调用次数, 处理条数]
+        self.stages = {}
+        # 计数器名 -> 值（如清洗后为空被丢弃的条数）
+        self.counters = {}
+
+    def add(self, stage, seconds, items=0, calls=1):
+        entry = self.stages.get(stage)
+        if entry is None:
+            self.stages[stage] = [seconds, calls, items]
+        else:
+            entry[0] += seconds
+            entry[1] += calls
+            entry[2] += items
+
+    @contextmanager
+    def stage(self, stage, items=0):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, items)
+
+    def timed_iter(self, stage, iterable, size=len):
+        """包装迭代器，把每次取下一项的耗时计入 stage，条数为 size(项)"""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(stage, time.perf_counter() - start, 0, calls=0)
+                return
+            self.add(stage, time.perf_counter() - start, size(item))
+            yield item
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def merge(self, other):
+        """合并另一个 StageMetrics 或其 snapshot()"""
+        if isinstance(other, StageMetrics):
+            other = other.snapshot()
+        for stage, values in other.get('stages', {}).items():
+            self.add(stage, values['seconds'], values['items'], values['calls'])
+        for name, value in other.get('counters', {}).items():
+            self.count(name, value)
+
+    def snapshot(self):
+        """可序列化、可跨进程传递的字典"""
+        return {
+            'stages': {
+                stage: {
+                    'seconds': seconds,
+                    'calls': calls,
+                    'items': items,
+                    'items_per_sec': items / seconds if seconds > 0 and items else None
+                }
+                for stage, (seconds, calls, items) in self.stages.items()
+            },
+            'counters': dict(self.counters)
+        }
+
+
+class RunMetrics(StageMetrics):
+    """一次批处理运行：整体累计 + 各产品明细"""
+
+    def __init__(self, pipeline):
+        super().__init__()
+        self.pipeline = pipeline
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.products = {}
+
+    def add_product(self, product_id, product_metrics):
+        """登记一个产品的计时（StageMetrics 或 snapshot），同时计入整体"""
+        if isinstance(product_metrics, StageMetrics):
+            product_metrics = product_metrics.snapshot()
+        self.products[product_id] = product_metrics
+        self.merge(product_metrics)
+
+    def report(self):
+        report = {
+            'pipeline': self.pipeline,
+            'started_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at)),
+            'wall_seconds': time.perf_counter() - self._start,
+            'products_processed': len(self.products)
+        }
+        report.update(self.snapshot())
+        report['products'] = self.products
+        return report
+
+    def print_summary(self):
+        """按耗时从高到低打印各阶段，便于定位瓶颈"""
+        print(f"{'阶段':<14}{'耗时(秒)':>10}{'条数':>10}{'条/秒':>12}")
+        for stage, (seconds, calls, items) in sorted(self.stages.items(), key=lambda x: -x[1][0]):
+            rate = f"{items / seconds:.1f}" if seconds > 0 and items else '-'
+            print(f"{stage:<16}{seconds:>10.3f}{items:>10}{rate:>14}")
+
+    def export_json(self, path):
+        _atomic_write(path, json.dumps(self.report(), ensure_ascii=False, indent=2))
+
+    def export_prometheus(self, path, prefix='jd_pipeline'):
+        """
+        写出 Prometheus textfile；只输出整体指标，
+        产品级明细基数太高（上千SKU），只保留在 JSON 报告中
+        """
+        labels = f'pipeline="{self.pipeline}"'
+        lines = []
+
+        def metric(name, help_text, metric_type, samples):
+            lines.append(f'# HELP {prefix}_{name} {help_text}')
+            lines.append(f'# TYPE {prefix}_{name} {metric_type}')
+            for sample_labels, value in samples:
+                lines.append(f'{prefix}_{name}{{{sample_labels}}} {value}')
+
+        metric('stage_seconds', 'Time spent in each stage during the last run, summed over worker processes.', 'gauge',
+               [(f'{labels},stage="{stage}"', f'{seconds:.6f}') for stage, (seconds, _, _) in self.stages.items()])
+        metric('stage_calls', 'Number of times each stage ran during the last run.', 'gauge',
+               [(f'{labels},stage="{stage}"', calls) for stage, (_, calls, _) in self.stages.items()])
+        metric('stage_items', 'Items (reviews) processed by each stage during the last run.', 'gauge',
+               [(f'{labels},stage="{stage}"', items) for stage, (_, _, items) in self.stages.items()])
+        metric('counter', 'Pipeline counters for the last run.', 'gauge',
+               [(f'{labels},name="{name}"', value) for name, value in self.counters.items()])
+        metric('run_wall_seconds', 'Total wall time of the last run.', 'gauge',
+               [(labels, f'{time.perf_counter() - self._start:.6f}')])
+        metric('run_products', 'Products processed in the last run.', 'gauge',
+               [(labels, len(self.products))])
+        metric('run_last_start_timestamp_seconds', 'Start time of the last run.', 'gauge',
+               [(labels, f'{self.started_at:.0f}')])
+        _atomic_write(path, '\n'.join(lines) + '\n')
+
+
+class Histogram:
+    """固定桶的延迟直方图（Prometheus histogram 语义）"""
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        # 最后一个桶为 +Inf
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+    def quantile(self, q):
+        """按桶估计分位数，返回所在桶的上界；落在 +Inf 桶时返回 None"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return None
+
+    def cumulative(self):
+        """[(桶上界, 不超过该上界的累计次数)]，最后一项上界为 '+Inf'"""
+        result = []
+        seen = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            seen += count
+            result.append((bound, seen))
+        return result
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': {str(bound): seen for bound, seen in self.cumulative()}
+        }
+
+
+class LatencyMetrics:
+    """
+    爬虫按页面类型统计的就绪延迟（从发起请求到等待条件满足）与等待超时次数
+    多标签页并发爬取时由多个线程同时记录，内部加锁
+    """
+
+    def __init__(self, crawler, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.crawler = crawler
+        self.buckets = buckets
+        self.started_at = time.time()
+        self.histograms = {}
+        self.timeouts = {}
+        self._lock = threading.Lock()
+
+    def observe(self, page_type, seconds):
+        with self._lock:
+            histogram = self.histograms.get(page_type)
+            if histogram is None:
+                histogram = self.histograms[page_type] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def timeout(self, page_type):
+        with self._lock:
+            self.timeouts[page_type] = self.timeouts.get(page_type, 0) + 1
+
+    def report(self):
+        with self._lock:
+            return {
+                'crawler': self.crawler,
+                'started_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at)),
+                'ready_seconds': {page_type: histogram.snapshot() for page_type, histogram in self.histograms.items()},
+                'timeouts': dict(self.timeouts)
+            }
+
+    def print_summary(self):
+        report = self.report()
+        print(f"{'页面':<14}{'次数':>8}{'平均(秒)':>10}{'P50':>8}{'P90':>8}{'P99':>8}{'超时':>6}")
+        for page_type in sorted(set(report['ready_seconds']) | set(report['timeouts'])):
+            stats = report['ready_seconds'].get(page_type) or Histogram(self.buckets).snapshot()
+            # 分位数为桶上界；None 表示没有记录或超出最大的桶
+            mean, p50, p90, p99 = ('-' if stats[key] is None else f"{stats[key]:.3g}"
+                                   for key in ('mean', 'p50', 'p90', 'p99'))
+            print(f"{page_type:<16}{stats['count']:>8}{mean:>12}{p50:>8}{p90:>8}{p99:>8}"
+                  f"{report['timeouts'].get(page_type, 0):>6}")
+
+    def export_json(self, path):
+        _atomic_write(path, json.dumps(self.report(), ensure_ascii=False, indent=2))
+
+    def export_prometheus(self, path, prefix='jd_crawler'):
+        labels = f'crawler="{self.crawler}"'
+        lines = [f'# HELP {prefix}_ready_seconds Time from request to page readiness.',
+                 f'# TYPE {prefix}_ready_seconds histogram']
+        with self._lock:
+            for page_type, histogram in self.histograms.items():
+                sample_labels = f'{labels},page="{page_type}"'
+                for bound, seen in histogram.cumulative():
+                    lines.append(f'{prefix}_ready_seconds_bucket{{{sample_labels},le="{bound}"}} {seen}')
+                lines.append(f'{prefix}_ready_seconds_sum{{{sample_labels}}} {histogram.sum:.6f}')
+                lines.append(f'{prefix}_ready_seconds_count{{{sample_labels}}} {histogram.count}')
+            lines.append(f'# HELP {prefix}_ready_timeouts Readiness waits that hit their timeout.')
+            lines.append(f'# TYPE {prefix}_ready_timeouts counter')
+            for page_type, value in self.timeouts.items():
+                lines.append(f'{prefix}_ready_timeouts{{{labels},page="{page_type}"}} {value}')
+        _atomic_write(path, '\n'.join(lines) + '\n')
+
+
+def _atomic_write(path, text):
+    # textfile collector 可能随时读取，先写临时文件再替换
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
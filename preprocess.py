@@ -0,0 +1,290 @@
+# preprocess.py
+"""
+评论文本预处理的公共函数，analysis.py / lda.py / pretreat.py 共用
+清洗规则：只保留中文字符和常用中文标点；表情符号、字母、数字、空白都不在保留范围内，
+因此原来的四次正则替换可以合并为一次预编译的替换
+停用词表、情感词典和 jieba 词典在每个进程内只加载一次，分词、情感打分提供批量接口
+"""
+
+import json
+import re
+from collections import defaultdict
+from functools import partial
+
+import jieba
+import numpy as np
+import pandas as pd
+
+from segcache import DEFAULT_CACHE_PATH, segment_texts
+
+STOPWORDS_PATH = 'stopwords.txt'
+POSITIVE_PATH = 'positive.txt'
+NEGATIVE_PATH = 'negative.txt'
+
+# 评论中保留的中文标点
+REVIEW_PUNCTUATION = '，。！？、；："\'’‘（）《》【】'
+
+
+def make_clean_pattern(punctuation=REVIEW_PUNCTUATION):
+    """生成匹配所有需删除字符的正则（中文字符与 punctuation 之外的一切）"""
+    return re.compile('[^\u4e00-\u9fa5' + re.escape(punctuation) + ']+')
+
+
+CLEAN_PATTERN = make_clean_pattern()
+
+
+def clean_text(text, pattern=CLEAN_PATTERN):
+    """单条文本清洗，非字符串返回空串"""
+    if not isinstance(text, str):
+        return ""
+    return pattern.sub('', text)
+
+
+def clean_texts(texts, pattern=CLEAN_PATTERN):
+    """
+    批量清洗，结果与逐条调用 clean_text 相同
+
+    参数:
+    texts - Series 或评论列表
+
+    返回:
+    清洗后的 Series，索引与输入 Series 一致
+    """
+    if not isinstance(texts, pd.Series):
+        texts = pd.Series(list(texts), dtype=object)
+    is_text = texts.map(lambda x: isinstance(x, str)).astype(bool)
+    return texts.where(is_text, '').astype(object).str.replace(pattern, '', regex=True)
+
+
+def clean_reviews(df, source='评论', target='cleaned_content', pattern=CLEAN_PATTERN):
+    """
+    清洗 df[source] 写入 df[target]，并去掉清洗后为空的评论
+
+    返回:
+    (清洗后的 DataFrame, 因清洗后为空被丢弃的行数)
+    """
+    return drop_empty(df.assign(**{target: clean_texts(df[source], pattern)}), target)
+
+
+def drop_empty(df, column='cleaned_content'):
+    """
+    去掉 df[column] 为空（或缺失）的行
+
+    返回:
+    (过滤后的 DataFrame, 被丢弃的行数)
+    """
+    non_empty = (df[column].fillna('').str.len() > 0).astype(bool)
+    return df[non_empty], int((~non_empty).sum())
+
+
+# 词典资源
+# ----------------------------
+def load_stopwords(filepath=STOPWORDS_PATH):
+    """读取停用词表，文件不存在时返回空集合"""
+    try:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            return set([line.strip() for line in f])
+    except OSError:
+        return set()
+
+
+def load_sentiment_dict(positive_path=POSITIVE_PATH, negative_path=NEGATIVE_PATH):
+    """读取正面、负面情感词典"""
+    with open(positive_path, 'r', encoding='utf-8') as f:
+        positive_words = set([line.strip() for line in f if line.strip()])
+    with open(negative_path, 'r', encoding='utf-8') as f:
+        negative_words = set([line.strip() for line in f if line.strip()])
+    return positive_words, negative_words
+
+
+# 进程内已加载的资源：(类型, 路径...) -> 对象
+_resources = {}
+
+
+def _resource(key, loader):
+    if key not in _resources:
+        _resources[key] = loader()
+    return _resources[key]
+
+
+def get_stopwords(filepath=STOPWORDS_PATH):
+    """停用词表，同一进程内只读取一次文件"""
+    return _resource(('stopwords', filepath), lambda: load_stopwords(filepath))
+
+
+def get_sentiment_dict(positive_path=POSITIVE_PATH, negative_path=NEGATIVE_PATH):
+    """(正面词集合, 负面词集合)，同一进程内只读取一次文件"""
+    return _resource(('sentiment', positive_path, negative_path),
+                     lambda: load_sentiment_dict(positive_path, negative_path))
+
+
+def get_sentiment_scorer(positive_path=POSITIVE_PATH, negative_path=NEGATIVE_PATH):
+    """基于 get_sentiment_dict 构建的 SentimentScorer，同一进程内只构建一次"""
+    return _resource(('scorer', positive_path, negative_path),
+                     lambda: SentimentScorer(*get_sentiment_dict(positive_path, negative_path)))
+
+
+def init_jieba():
+    """构建 jieba 前缀词典（约1秒）并加载词性标注模型；已构建时直接返回，首次分词前调用可把这部分开销提前"""
+    import jieba.posseg
+    jieba.initialize()
+
+
+def preload(stopwords_path=STOPWORDS_PATH, positive_path=POSITIVE_PATH, negative_path=NEGATIVE_PATH):
+    """一次性加载分词和情感分析用到的全部资源"""
+    init_jieba()
+    get_stopwords(stopwords_path)
+    get_sentiment_scorer(positive_path, negative_path)
+
+
+# 分词
+# ----------------------------
+def seg_text(text, use_stopwords=True, use_pos=False, stopwords_path=STOPWORDS_PATH):
+    """
+    单条文本分词
+
+    返回:
+    use_pos 为 True 时为 [(词, 词性)]，否则为 [词]
+    """
+    min_word_length = 1
+    stopwords = get_stopwords(stopwords_path) if use_stopwords else ()
+    if use_pos:
+        # jieba.posseg 导入时加载词性标注模型（约0.3秒），只在需要词性标注时导入
+        import jieba.posseg as psg
+        return [(w.word, w.flag) for w in psg.cut(text) if w.word not in stopwords and len(w.word) >= min_word_length]
+    return [w for w in jieba.cut(text) if w not in stopwords and len(w) >= min_word_length]
+
+
+def segment_batch(texts, use_stopwords=True, use_pos=False, cache_path=DEFAULT_CACHE_PATH):
+    """
+    批量分词，结果与逐条调用 seg_text 相同
+
+    参数:
+    texts - 清洗后的文本（Series 或列表）
+    cache_path - 分词缓存文件，为空时不使用缓存
+
+    返回:
+    分词结果列表，顺序与 texts 一致
+    """
+    # 缓存键区分分词模式；保留停用词的结果单独存放
+    mode = ('pos' if use_pos else 'word') + ('' if use_stopwords else '-all')
+    return segment_texts(texts, partial(seg_text, use_stopwords=use_stopwords, use_pos=use_pos), mode, cache_path)
+
+
+# 情感分析
+# ----------------------------
+def sentiment_analyzer(word_list):
+    """单条评论的情感判断，返回 (情感标签, 正面词数, 负面词数)"""
+    positive_set, negative_set = get_sentiment_dict()
+    positive_count = sum(1 for word in word_list if word in positive_set)
+    negative_count = sum(1 for word in word_list if word in negative_set)
+    if positive_count > negative_count:
+        return '正面', positive_count, negative_count
+    elif negative_count > positive_count:
+        return '负面', positive_count, negative_count
+    else:
+        return '中性', positive_count, negative_count
+
+
+class SentimentScorer:
+    """
+    批量情感打分，结果与逐条调用 sentiment_analyzer 相同
+
+    情感词典中的词编号为整数id，词典外的词统一映射到最后一个id；
+    用布尔查找表标记正/负面词，所有评论的计数通过一次 bincount 得到
+    """
+
+    def __init__(self, positive_words, negative_words):
+        self.word_ids = {word: i for i, word in enumerate(sorted(positive_words | negative_words))}
+        self.unknown_id = len(self.word_ids)
+        self.is_positive = np.zeros(self.unknown_id + 1, dtype=bool)
+        self.is_negative = np.zeros(self.unknown_id + 1, dtype=bool)
+        for word, i in self.word_ids.items():
+            self.is_positive[i] = word in positive_words
+            self.is_negative[i] = word in negative_words
+
+    def score(self, segmented):
+        """
+        参数:
+        segmented - 分词结果序列（Series 或 list），可以混合多个产品的评论
+
+        返回:
+        DataFrame，列为 sentiment_label / positive_count / negative_count，索引与输入一致
+        """
+        index = segmented.index if isinstance(segmented, pd.Series) else None
+        word_lists = list(segmented)
+        n = len(word_lists)
+        lengths = np.fromiter((len(words) for words in word_lists), dtype=np.int64, count=n)
+        ids = np.fromiter((self.word_ids.get(word, self.unknown_id) for words in word_lists for word in words),
+                          dtype=np.int64, count=int(lengths.sum()))
+        review_idx = np.repeat(np.arange(n), lengths)
+
+        positive_count = np.bincount(review_idx[self.is_positive[ids]], minlength=n)
+        negative_count = np.bincount(review_idx[self.is_negative[ids]], minlength=n)
+        labels = np.where(positive_count > negative_count, '正面',
+                          np.where(negative_count > positive_count, '负面', '中性'))
+        return pd.DataFrame({
+            'sentiment_label': labels.astype(object),
+            'positive_count': positive_count,
+            'negative_count': negative_count
+        }, index=index)
+
+
+def score_sentiment(segmented):
+    """批量情感打分，见 SentimentScorer.score"""
+    return get_sentiment_scorer().score(segmented)
+
+
+# 特征提取
+# ----------------------------
+class FeatureLexicon:
+    """特征词典：词 -> 类别 的哈希索引，一次构建后重复使用，analysis.py / pretreat.py 共用"""
+
+    def __init__(self, categories):
+        """categories 与 feature_categories 结构相同：{类别: [特征词]}"""
+        self.categories = {category: list(words) for category, words in categories.items()}
+        self.word_category = {}
+        for category, words in self.categories.items():
+            for word in words:
+                # 同一个词出现在多个类别时以先出现的类别为准，与逐类别扫描的结果一致
+                self.word_category.setdefault(word, category)
+
+    @classmethod
+    def from_file(cls, path):
+        """
+        从文件加载特征词典
+
+        .json 文件：{类别: [特征词]}
+        其他文本文件：每行 "类别 词1 词2 ..."，同一类别可分多行，# 开头为注释
+        """
+        with open(path, 'r', encoding='utf-8') as f:
+            if path.endswith('.json'):
+                return cls(json.load(f))
+            categories = {}
+            for line in f:
+                parts = line.split()
+                if not parts or parts[0].startswith('#'):
+                    continue
+                categories.setdefault(parts[0], []).extend(parts[1:])
+        return cls(categories)
+
+    def tag(self, pos_tags):
+        """
+        提取技术特征词
+        返回格式：{特征类别: [特征词]}，名词中未匹配到类别的归入 '其他'
+        """
+        features = defaultdict(list)
+        word_category = self.word_category
+        for word, pos in pos_tags:
+            # 筛选特征词性（名词、动词）
+            if pos.startswith(('n', 'v')):
+                category = word_category.get(word)
+                if category is not None:
+                    features[category].append(word)
+                elif pos.startswith('n'):
+                    features['其他'].append(word)
+        return dict(features)
+
+    def tag_many(self, pos_tag_lists):
+        """对多条评论的 (词, 词性) 列表批量提取特征"""
+        return [self.tag(pos_tags) for pos_tags in pos_tag_lists]
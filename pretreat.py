@@ -1,29 +1,29 @@
 import json
-from collections import defaultdict
-import jieba
 import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-import re #正则表达式
-import jieba.posseg as psg #中文分词和词性标注
 from collections import Counter
 
 
 import warnings
 
-from pyecharts.charts import WordCloud
-
 warnings.filterwarnings("ignore")
 
 
 import os
+from reviewstore import read_reviews, REVIEW_COLUMNS
+from reviewio import iter_reviews
+from preprocess import (make_clean_pattern, clean_reviews, segment_batch,
+                        score_sentiment, FeatureLexicon)
+from segpool import SegmentPool
+from featurestats import FeatureAggregator, empty_report
 file_path='jd/4772588.json'
-with open(file_path, 'r', encoding='utf-8') as f:
-    reviews = json.load(f)  # reviews 是 Python list
-
-# 转换为DataFrame
-df = pd.DataFrame(reviews)  # df 是 Pandas DataFrame
+STORE_DIR = None  # 设置为 Parquet 评论库目录时从评论库读取该产品
+SEG_WORKERS = 1  # 分词进程数，大于1时工作进程继承主进程已初始化的 jieba 词典
+if STORE_DIR:
+    df = read_reviews(STORE_DIR, columns=REVIEW_COLUMNS,
+                      product_ids=[os.path.splitext(os.path.basename(file_path))[0]]).drop(columns='product_id')
+else:
+    # 评论文件可能是 JSON Lines（jdcomments 逐页写出）或早期的JSON数组，逐条读取后转换为DataFrame
+    df = pd.DataFrame(list(iter_reviews(file_path)))  # df 是 Pandas DataFrame
 
 # 正确用法：对DataFrame操作
 print("数据维度:", df.shape)  # 显示(行数, 列数)
@@ -50,37 +50,14 @@ meaningless_comments = ["此用户没有填写评价", "评价方未及时评价
 df = df[~df['评论'].isin(meaningless_comments)]
 
 
-# 3.3 定义文本清洗函数
-def clean_text(text):
-    if not isinstance(text, str):
-        return ""
-
-    # 去除表情符号
-    emoji_pattern = re.compile("["
-                               u"\U0001F600-\U0001F64F"  # emoticons
-                               u"\U0001F300-\U0001F5FF"  # symbols & pictographs
-                               u"\U0001F680-\U0001F6FF"  # transport & map symbols
-                               u"\U0001F1E0-\U0001F1FF"  # flags (iOS)
-                               "]+", flags=re.UNICODE)
-    text = emoji_pattern.sub(r'', text)
-
-    # 保留中文和中文标点
-    text = re.sub(r'[^\u4e00-\u9fa5，。！？、；："\'（）《》【】]', '', text)
-
-    # 去除数字和字母
-    text = re.sub(r'[a-zA-Z0-9]', '', text)
-
-    # 去除多余空格和特殊空白字符
-    text = re.sub(r'\s+', '', text)
+# 3.3 定义文本清洗规则
+# 只保留中文和中文标点（表情符号、字母数字、空白一并去除），正则预编译一次
+CLEAN_PATTERN = make_clean_pattern('，。！？、；："\'（）《》【】')
 
-    return text.strip()
 
-
-# 应用清洗函数
-df['cleaned_content'] = df['评论'].apply(clean_text)
-
-# 3.4 去除清洗后为空的评论
-df = df[df['cleaned_content'].str.len() > 0]
+# 应用清洗函数并去除清洗后为空的评论（3.4）
+df, empty_count = clean_reviews(df, pattern=CLEAN_PATTERN)
+print("\n清洗后为空被去除的评论数:", empty_count)
 
 # 4. 结果展示
 print("\n清洗后数据维度:", df.shape)
@@ -95,43 +72,18 @@ print("\n有效评论内容数量:", len(content))
 
 
 # 3. 中文分词处理
-# 加载停用词表（需准备或使用默认）
-def load_stopwords(filepath='stopwords.txt'):
-    try:
-        with open(filepath, 'r', encoding='utf-8') as f:
-            return set([line.strip() for line in f])
-    except:
-        return set()
-
-stopwords = load_stopwords()
-
-# 分词函数
-# 修改后的分词函数（更清晰的过滤逻辑）
-def seg_text(text, use_stopwords=True, use_pos=False):
-    # 允许单独控制长度过滤
-    min_word_length = 1 # 原为2
-
-    if use_pos:
-        words = psg.cut(text)
-        if use_stopwords:
-            return [(w.word, w.flag) for w in words
-                    if w.word not in stopwords
-                    and len(w.word) >= min_word_length]
-        return [(w.word, w.flag) for w in words
-                if len(w.word) >= min_word_length]
-    else:
-        words = jieba.cut(text)
-        if use_stopwords:
-            return [w for w in words
-                    if w not in stopwords
-                    and len(w) >= min_word_length]
-        return [w for w in words
-                if len(w) >= min_word_length]
-
-# 添加分词结果列
+# 停用词表、jieba 词典由 preprocess 在进程内加载一次
+# 添加分词结果列（posseg 的切分与 jieba.cut 不同，普通分词和词性标注分词各做一次）
 print("\n正在进行分词处理...")
-df['segmented'] = df['cleaned_content'].apply(lambda x: seg_text(x, use_stopwords=True, use_pos=False))
-df['segmented_pos'] = df['cleaned_content'].apply(lambda x: seg_text(x, use_stopwords=True, use_pos=True))
+if SEG_WORKERS > 1:
+    with SegmentPool(SEG_WORKERS) as seg_pool:
+        segmented = seg_pool.segment(df['cleaned_content'], use_stopwords=True, use_pos=False)
+        segmented_pos = seg_pool.segment(df['cleaned_content'], use_stopwords=True, use_pos=True)
+else:
+    segmented = segment_batch(df['cleaned_content'], use_stopwords=True, use_pos=False)
+    segmented_pos = segment_batch(df['cleaned_content'], use_stopwords=True, use_pos=True)
+df['segmented'] = pd.Series(segmented, index=df.index, dtype=object)
+df['segmented_pos'] = pd.Series(segmented_pos, index=df.index, dtype=object)
 
 # 4. 分词结果分析
 # 词频统计
@@ -188,41 +140,9 @@ print("高频词已存储到 'high_frequency_words.json' 文件中。")
 
 
 # ========== 情感分析 ==========
-# 1. 加载情感词典
-def load_sentiment_dict(positive_path='positive.txt', negative_path='negative.txt'):
-    with open(positive_path, 'r', encoding='utf-8') as f:
-        positive_words = set([line.strip() for line in f if line.strip()])
-
-    with open(negative_path, 'r', encoding='utf-8') as f:
-        negative_words = set([line.strip() for line in f if line.strip()])
-
-    return positive_words, negative_words
-
-
-positive_set, negative_set = load_sentiment_dict()
-
-
-# 2. 定义情感分析函数
-def sentiment_analyzer(word_list):
-    positive_count = sum(1 for word in word_list if word in positive_set)
-    negative_count = sum(1 for word in word_list if word in negative_set)
-
-    # 情感判断逻辑
-    if positive_count > negative_count:
-        return '正面', positive_count, negative_count
-    elif negative_count > positive_count:
-        return '负面', positive_count, negative_count
-    else:
-        return '中性', positive_count, negative_count
-
-
-# 3. 应用情感分析
+# 情感词典由 preprocess 在进程内加载一次，批量打分
 print("\n正在进行情感标注...")
-sentiment_results = df['segmented'].apply(
-    lambda x: pd.Series(sentiment_analyzer(x),
-                        index=['sentiment_label', 'positive_count', 'negative_count'])
-)
-df = pd.concat([df, sentiment_results], axis=1)
+df = pd.concat([df, score_sentiment(df['segmented'])], axis=1)
 
 # 4. 结果验证
 print("\n情感分布统计:")
@@ -243,7 +163,10 @@ with open('sentiment_analysis.json', 'w', encoding='utf-8') as f:
     json.dump(sentiment_data, f, ensure_ascii=False, indent=4)
 print("\n情感分析结果已存储到 sentiment_analysis.json")
 
-# 6. 可视化展示（可选）
+# 6. 可视化展示（可选，绘图库只在此处导入）
+import matplotlib.pyplot as plt
+import seaborn as sns
+
 plt.figure(figsize=(10, 6))
 sns.countplot(x='sentiment_label', data=df, order=['正面', '中性', '负面'])
 plt.title('评论情感分布')
@@ -264,70 +187,20 @@ feature_categories = {
 
 
 # ========== 2. 定义特征提取函数 ==========
-def extract_features(segmented_text, pos_tags):
-    """
-    提取技术特征词和修饰词组合
-    返回格式：{特征类别: [特征词]}
-    """
-    features = defaultdict(list)
-
-    # 组合词性规则：名词/动词 + 形容词/副词
-    for word, pos in pos_tags:
-        # 筛选特征词性（名词、动词）
-        if pos.startswith(('n', 'v')):
-            # 匹配预定义特征类别
-            for category, keywords in feature_categories.items():
-                if word in keywords:
-                    features[category].append(word)
-                    break
-            else:  # 未匹配到预定义类别的通用处理
-                if pos.startswith('n'):
-                    features['其他'].append(word)
-    return dict(features)
-
+# 特征词典一次构建为 词 -> 类别 的哈希索引
+feature_lexicon = FeatureLexicon(feature_categories)
 
 # 应用特征提取
 print("\n正在提取产品特征...")
-df['features'] = df['segmented_pos'].apply(
-    lambda x: extract_features([w[0] for w in x], x)
-)
+df['features'] = pd.Series(feature_lexicon.tag_many(df['segmented_pos']), index=df.index, dtype=object)
 
 
 # ========== 3. 生成优缺点报告 ==========
 def generate_analysis_report(df):
-    # 初始化报告结构
-    report = {
-        '优点': defaultdict(list),
-        '缺点': defaultdict(list),
-        'statistics': {
-            '总评论数': len(df),
-            '正面评论数': len(df[df['sentiment_label'] == '正面']),
-            '负面评论数': len(df[df['sentiment_label'] == '负面'])
-        }
-    }
-
-    # 分析正面评价
-    positive_df = df[df['sentiment_label'] == '正面']
-    for _, row in positive_df.iterrows():
-        for category, words in row['features'].items():
-            report['优点'][category].extend(words)
-
-    # 分析负面评价
-    negative_df = df[df['sentiment_label'] == '负面']
-    for _, row in negative_df.iterrows():
-        for category, words in row['features'].items():
-            report['缺点'][category].extend(words)
-
-    # 统计词频并排序
-    for aspect in ['优点', '缺点']:
-        for category in report[aspect]:
-            counter = Counter(report[aspect][category])
-            report[aspect][category] = [
-                {"特征词": word, "出现次数": count}
-                for word, count in counter.most_common(5)
-            ]
-
-    return report
+    """按 (情感, 类别, 特征词) 分组统计词频，结构与 analysis.py 的报告相同"""
+    aggregator = FeatureAggregator()
+    aggregator.add(df, product_id='')
+    return aggregator.reports().get('', empty_report())
 
 
 # 生成报告
@@ -340,9 +213,6 @@ print("产品分析报告已保存到 product_analysis_report.json")
 
 import math
 
-# 生成分析报告
-analysis_report = generate_analysis_report(df)
-
 # 定义针对各个指标的打分函数
 def evaluate_product_features_by_category(report):
     # 初始化各个指标的分数
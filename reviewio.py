@@ -0,0 +1,83 @@
+# reviewio.py
+"""
+评论文件的流式读取
+早期 jdcomments 写出的是JSON数组（indent=2），现在逐页写出 JSON Lines（见 commentsink.py），热门商品可达数万条评论；
+这里按块读取文件并逐条解析记录，内存占用只与块大小有关，不随文件增长
+"""
+
+import json
+
+import pandas as pd
+
+DEFAULT_READ_SIZE = 1 << 16
+DEFAULT_BATCH_SIZE = 5000
+
+_WHITESPACE = ' \t\r\n'
+
+
+def iter_reviews(file_path, read_size=DEFAULT_READ_SIZE):
+    """
+    逐条产出评论记录（dict）
+
+    支持JSON数组文件，也支持逐行/连续存放的JSON对象（JSONL）
+    """
+    decoder = json.JSONDecoder()
+    with open(file_path, 'r', encoding='utf-8') as f:
+        buf = ''
+        pos = 0
+        eof = False
+        in_array = None
+
+        def fill():
+            # 丢弃已解析部分并追加新数据，返回是否读到了新内容
+            nonlocal buf, pos, eof
+            data = f.read(read_size)
+            buf = buf[pos:] + data
+            pos = 0
+            if not data:
+                eof = True
+            return bool(data)
+
+        while True:
+            # 跳过空白和数组分隔符
+            while pos < len(buf) and (buf[pos] in _WHITESPACE or (in_array and buf[pos] == ',')):
+                pos += 1
+            if pos >= len(buf):
+                if eof or not fill():
+                    break
+                continue
+
+            if in_array is None:
+                # 首个有效字符决定文件格式；兼容带BOM的文件
+                if buf[pos] == '\ufeff':
+                    pos += 1
+                    continue
+                in_array = buf[pos] == '['
+                if in_array:
+                    pos += 1
+                continue
+
+            if in_array and buf[pos] == ']':
+                break
+
+            try:
+                record, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                # 记录跨越了读取块的边界，继续读入后重试
+                if eof or not fill():
+                    raise
+                continue
+            pos = end
+            yield record
+
+
+def iter_review_batches(file_path, batch_size=DEFAULT_BATCH_SIZE, read_size=DEFAULT_READ_SIZE):
+    """按 batch_size 条一组产出 DataFrame，供分块的清洗、分词和统计使用"""
+    batch = []
+    for record in iter_reviews(file_path, read_size):
+        batch.append(record)
+        if len(batch) >= batch_size:
+            yield pd.DataFrame(batch)
+            batch = []
+    if batch:
+        yield pd.DataFrame(batch)
@@ -0,0 +1,123 @@
+# reviewstore.py
+"""
+按产品分区的 Parquet 评论库
+目录结构：<store_dir>/product_id=<产品ID>/part-0.parquet（hive 分区）
+列：name, 评分, 产品, 日期, 评论, cleaned_content
+爬取完成后写入一次，后续各分析脚本按需读取部分列、按日期等条件过滤，不再逐个解析JSON
+需要安装 pyarrow
+"""
+
+import os
+
+import pandas as pd
+
+from preprocess import clean_texts
+from reviewio import iter_reviews
+
+DEFAULT_STORE_DIR = 'review_store'
+REVIEW_COLUMNS = ['name', '评分', '产品', '日期', '评论']
+_PART_FILE = 'part-0.parquet'
+
+
+def partition_dir(store_dir, product_id):
+    return os.path.join(store_dir, f'product_id={product_id}')
+
+
+def partition_file(store_dir, product_id):
+    return os.path.join(partition_dir(store_dir, product_id), _PART_FILE)
+
+
+def _partitioning():
+    # 产品ID按字符串处理，避免纯数字ID被推断为整数后与字符串条件比较失败
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    return ds.partitioning(pa.schema([('product_id', pa.string())]), flavor='hive')
+
+
+def write_product(reviews, product_id, store_dir=DEFAULT_STORE_DIR):
+    """
+    写入（覆盖）一个产品的全部评论
+
+    参数:
+    reviews - jdcomments.extract_comments 产出的评论字典列表，或同列的 DataFrame
+    """
+    df = pd.DataFrame(reviews).reindex(columns=REVIEW_COLUMNS)
+    # 统一为字符串列，保证各分区的表结构一致
+    df = df.astype('string')
+    df['cleaned_content'] = clean_texts(df['评论'].astype(object)).astype('string')
+
+    path = partition_file(store_dir, product_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # 先写临时文件再替换，读取方不会看到写了一半的分区
+    tmp_path = path + '.tmp'
+    df.to_parquet(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def list_products(store_dir=DEFAULT_STORE_DIR):
+    """按产品ID排序列出库中的全部产品"""
+    if not os.path.isdir(store_dir):
+        return []
+    products = []
+    for name in os.listdir(store_dir):
+        if name.startswith('product_id=') and os.path.exists(os.path.join(store_dir, name, _PART_FILE)):
+            products.append(name[len('product_id='):])
+    return sorted(products)
+
+
+def _date_filter(since):
+    import pyarrow.dataset as ds
+    # 日期为 'YYYY-MM-DD HH:MM:SS' 形式的字符串，按字典序比较即可；可利用行组统计跳过旧数据
+    return ds.field('日期') >= since if since else None
+
+
+def iter_product_batches(product_id, store_dir=DEFAULT_STORE_DIR, columns=None, since=None,
+                         batch_size=5000):
+    """
+    按块读取单个产品的评论（列裁剪 + 谓词下推），每块为一个 DataFrame
+
+    参数:
+    columns - 需要的列，None 表示全部
+    since - 只读取该日期（含）之后的评论
+    """
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(partition_file(store_dir, product_id), format='parquet')
+    for batch in dataset.to_batches(columns=columns, filter=_date_filter(since), batch_size=batch_size):
+        if batch.num_rows:
+            yield batch.to_pandas()
+
+
+def read_reviews(store_dir=DEFAULT_STORE_DIR, columns=None, product_ids=None, since=None):
+    """
+    读取多个产品的评论，返回带 product_id 列的 DataFrame
+
+    参数:
+    product_ids - 只读取这些产品（分区裁剪），None 表示全部
+    since - 只读取该日期（含）之后的评论
+    """
+    import pyarrow.dataset as ds
+    dataset = ds.dataset(store_dir, format='parquet', partitioning=_partitioning())
+    condition = _date_filter(since)
+    if product_ids is not None:
+        product_condition = ds.field('product_id').isin([str(p) for p in product_ids])
+        condition = product_condition if condition is None else condition & product_condition
+    if columns is not None and 'product_id' not in columns:
+        columns = ['product_id'] + list(columns)
+    return dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+
+def import_json_folder(folder_path='jd', store_dir=DEFAULT_STORE_DIR):
+    """把 jd/ 下已有的JSON评论文件一次性导入评论库"""
+    for filename in sorted(os.listdir(folder_path)):
+        if filename.endswith('.json'):
+            product_id = os.path.splitext(filename)[0]
+            try:
+                write_product(list(iter_reviews(os.path.join(folder_path, filename))), product_id, store_dir)
+                print(f"已导入：{product_id}")
+            except Exception as e:
+                print(f"导入文件 {filename} 时出错: {str(e)}")
+
+
+if __name__ == '__main__':
+    import_json_folder('jd', DEFAULT_STORE_DIR)
@@ -0,0 +1,183 @@
+# segcache.py
+"""
+分词结果持久化缓存
+键：清洗后文本 + 分词模式 + 停用词/jieba词典版本 的哈希
+值：seg_text / psg.cut 的输出（JSON 存储）
+存储：本地 SQLite 文件，按最近使用时间做 LRU 淘汰，并累计命中/未命中次数；
+条目数在 stats 表中随写入和淘汰增减，判断是否超出容量时不必扫描整张表
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+import jieba
+
+DEFAULT_CACHE_PATH = 'seg_cache.sqlite'
+DEFAULT_MAX_ENTRIES = 1000000
+# SQLite 单条语句的参数个数上限较小，批量查询按此大小分段
+_QUERY_CHUNK = 500
+
+
+def file_digest(path):
+    """计算文件内容的 sha1，文件不存在时返回空串"""
+    h = hashlib.sha1()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                h.update(block)
+    except OSError:
+        return ''
+    return h.hexdigest()
+
+
+def segmentation_version(stopwords_path='stopwords.txt', extra_files=()):
+    """
+    分词结果的版本号：停用词表、jieba 主词典及额外词典（如自定义词典）任一变化都会使旧缓存失效
+    """
+    h = hashlib.sha1()
+    h.update(jieba.__version__.encode())
+    h.update(file_digest(stopwords_path).encode())
+    dict_path = jieba.dt.dictionary
+    if dict_path is None:
+        with jieba.get_dict_file() as f:
+            h.update(hashlib.sha1(f.read()).hexdigest().encode())
+    else:
+        h.update(file_digest(dict_path).encode())
+    for path in extra_files:
+        h.update(file_digest(path).encode())
+    return h.hexdigest()
+
+
+class SegmentCache:
+    """基于 SQLite 的分词缓存，每个进程持有独立连接"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, version='', max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.version = version
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        # 多进程同时读写同一缓存文件，使用 WAL 模式并放宽锁等待
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS seg ('
+                          'key TEXT PRIMARY KEY, tokens TEXT NOT NULL, last_used REAL NOT NULL)')
+        self.conn.execute('CREATE INDEX IF NOT EXISTS seg_last_used ON seg(last_used)')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        # 旧版缓存文件没有条目计数，首次打开时统计一次
+        self.conn.execute("INSERT OR IGNORE INTO stats (name, value) SELECT 'entries', COUNT(*) FROM seg")
+        self.conn.commit()
+
+    def make_key(self, text, mode):
+        return hashlib.sha1(f'{self.version}\0{mode}\0{text}'.encode('utf-8')).hexdigest()
+
+    def segment(self, texts, seg_func, mode):
+        """
+        批量分词：命中缓存的文本直接返回，未命中的调用 seg_func 分词后写回缓存
+
+        参数:
+        texts - 清洗后的文本列表
+        seg_func - 单条文本的分词函数
+        mode - 分词模式标识（如 'pos'、'word'），不同模式的结果分开缓存
+        """
+        texts = list(texts)
+        keys = [self.make_key(text, mode) for text in texts]
+        found = self._lookup(set(keys))
+
+        results = []
+        new_entries = {}
+        for text, key in zip(texts, keys):
+            if key in found:
+                results.append(found[key])
+            elif key in new_entries:
+                results.append(new_entries[key])
+            else:
+                tokens = seg_func(text)
+                new_entries[key] = tokens
+                results.append(tokens)
+
+        hits = len(texts) - len(new_entries)
+        self.hits += hits
+        self.misses += len(new_entries)
+        self._store(found.keys(), new_entries, hits)
+        return results
+
+    def _lookup(self, keys):
+        found = {}
+        keys = list(keys)
+        for i in range(0, len(keys), _QUERY_CHUNK):
+            chunk = keys[i:i + _QUERY_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.conn.execute(f'SELECT key, tokens FROM seg WHERE key IN ({placeholders})', chunk)
+            for key, tokens in rows:
+                # JSON 会把 (词, 词性) 元组存成列表，这里还原
+                found[key] = [tuple(t) if isinstance(t, list) else t for t in json.loads(tokens)]
+        return found
+
+    def _store(self, hit_keys, new_entries, hits):
+        now = time.time()
+        hit_keys = list(hit_keys)
+        with self.conn:
+            for i in range(0, len(hit_keys), _QUERY_CHUNK):
+                chunk = hit_keys[i:i + _QUERY_CHUNK]
+                placeholders = ','.join('?' * len(chunk))
+                self.conn.execute(f'UPDATE seg SET last_used = ? WHERE key IN ({placeholders})', [now] + chunk)
+            # 其他进程可能刚写入同一键（结果相同），跳过即可；条目数只计真正新增的行
+            inserted = self.conn.executemany(
+                'INSERT OR IGNORE INTO seg (key, tokens, last_used) VALUES (?, ?, ?)',
+                [(key, json.dumps(tokens, ensure_ascii=False), now) for key, tokens in new_entries.items()]).rowcount
+            self._add_stat('hits', hits)
+            self._add_stat('misses', len(new_entries))
+            self._add_stat('entries', inserted)
+        if new_entries:
+            self.evict()
+
+    def _add_stat(self, name, delta):
+        self.conn.execute('INSERT INTO stats (name, value) VALUES (?, ?) '
+                          'ON CONFLICT(name) DO UPDATE SET value = value + excluded.value', (name, delta))
+
+    def evict(self):
+        """超过容量上限时按最近使用时间淘汰最旧的条目"""
+        count = self.conn.execute("SELECT value FROM stats WHERE name = 'entries'").fetchone()[0]
+        excess = count - self.max_entries
+        if excess > 0:
+            with self.conn:
+                removed = self.conn.execute('DELETE FROM seg WHERE key IN '
+                                            '(SELECT key FROM seg ORDER BY last_used LIMIT ?)', (excess,)).rowcount
+                self._add_stat('evictions', removed)
+                self._add_stat('entries', -removed)
+
+    def stats(self):
+        """返回缓存累计统计（所有进程、所有运行的合计）"""
+        return dict(self.conn.execute('SELECT name, value FROM stats'))
+
+    def close(self):
+        self.conn.close()
+
+
+# 进程内共享的缓存实例；fork 出的子进程不能复用父进程的 SQLite 连接，按 pid 重新打开
+_cache = None
+_cache_pid = None
+
+
+def get_cache(path=DEFAULT_CACHE_PATH, stopwords_path='stopwords.txt', max_entries=DEFAULT_MAX_ENTRIES):
+    """获取当前进程的分词缓存，path 为空时返回 None（不使用缓存）"""
+    global _cache, _cache_pid
+    if not path:
+        return None
+    if _cache is None or _cache_pid != os.getpid() or _cache.path != path:
+        _cache = SegmentCache(path, version=segmentation_version(stopwords_path), max_entries=max_entries)
+        _cache_pid = os.getpid()
+    return _cache
+
+
+def segment_texts(texts, seg_func, mode, cache_path=DEFAULT_CACHE_PATH):
+    """带缓存的批量分词；cache_path 为空时直接逐条调用 seg_func"""
+    cache = get_cache(cache_path)
+    if cache is None:
+        return [seg_func(text) for text in texts]
+    return cache.segment(texts, seg_func, mode)
@@ -0,0 +1,70 @@
+# segpool.py
+"""
+共享预初始化 jieba 的分词进程池
+主进程先构建 jieba 前缀词典、加载停用词表和情感词典（preprocess.preload），再以 fork 方式启动工作进程，
+子进程以 copy-on-write 方式继承这些状态，不再各自花约1秒构建词典；
+不支持 fork 的平台（Windows）退化为 spawn，每个工作进程启动时初始化一次
+"""
+
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from preprocess import preload, segment_batch
+from segcache import DEFAULT_CACHE_PATH
+
+# 每个任务分词的文本条数；不超过该条数的批次直接在主进程分词，省去进程间传输
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def worker_context():
+    """优先使用 fork，平台不支持时使用 spawn"""
+    if 'fork' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('fork')
+    return multiprocessing.get_context('spawn')
+
+
+def worker_pool(workers=None):
+    """
+    创建工作进程已完成词典初始化的 ProcessPoolExecutor
+
+    fork 模式下在主进程 preload 一次，子进程直接继承；spawn 模式下每个子进程启动时 preload
+    """
+    context = worker_context()
+    if context.get_start_method() == 'fork':
+        preload()
+        return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=preload)
+
+
+class SegmentPool:
+    """
+    并行分词，结果顺序与 preprocess.segment_batch 相同
+
+    用法:
+    with SegmentPool(4) as pool:
+        segmented = pool.segment(texts, use_pos=True)
+    """
+
+    def __init__(self, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.chunk_size = chunk_size
+        self.executor = worker_pool(workers)
+
+    def segment(self, texts, use_stopwords=True, use_pos=False, cache_path=DEFAULT_CACHE_PATH):
+        """参数与返回值同 preprocess.segment_batch；各工作进程使用各自的分词缓存连接"""
+        texts = list(texts)
+        seg = partial(segment_batch, use_stopwords=use_stopwords, use_pos=use_pos, cache_path=cache_path)
+        if len(texts) <= self.chunk_size:
+            return seg(texts)
+        chunks = [texts[i:i + self.chunk_size] for i in range(0, len(texts), self.chunk_size)]
+        # map 按提交顺序返回，拼接后与输入一一对应
+        return [tokens for part in self.executor.map(seg, chunks) for tokens in part]
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,151 @@
+# tabpool.py
+"""
+多标签页并发爬取
+在同一个浏览器中打开固定数量的标签页，每个标签页同一时刻只由一个线程操作，
+标签页数即全局并发上限（同时打开的商品页数），登录状态和 cookie 在标签页间共享；
+单个商品出错只记录该商品，出错的标签页关闭后换一个新的，其他标签页不受影响；
+浏览器不可用、所有标签页都已关闭且开不出新的时，不再取下一个商品，只把已交给标签页的商品记为出错后返回，不会一直等待
+"""
+
+import queue
+import threading
+from itertools import islice
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+DEFAULT_TABS = 4
+NO_TAB_ERROR = '没有可用的标签页'
+# 所有标签页都已关闭时放入空闲队列，唤醒正在等待标签页的线程
+_CLOSED = object()
+
+
+class TabPool:
+    """
+    用法:
+    with TabPool(page, 4) as pool:
+        failed = pool.crawl(product_ids, scrape_product)
+
+    scrape_product(tab, product_id) 在工作线程中调用，用 tab 完成一个商品的抓取和保存
+    """
+
+    def __init__(self, page, tabs=DEFAULT_TABS, setup_tab=None):
+        """
+        参数:
+        page - ChromiumPage，新标签页从这个浏览器打开
+        tabs - 标签页数（并发上限）
+        setup_tab - 新标签页打开后调用一次的函数，如伪装 webdriver
+        """
+        self.page = page
+        self.tabs = tabs
+        self.setup_tab = setup_tab
+        self._idle = queue.Queue()
+        self._opened = []
+        self._lock = threading.Lock()
+        for _ in range(tabs):
+            self._idle.put(self._new_tab())
+
+    def _new_tab(self):
+        tab = self.page.new_tab()
+        if self.setup_tab:
+            self.setup_tab(tab)
+        with self._lock:
+            self._opened.append(tab)
+        return tab
+
+    def _discard(self, tab):
+        with self._lock:
+            self._opened.remove(tab)
+        try:
+            tab.close()
+        except Exception:
+            pass
+
+    def run(self, task, product_id):
+        """
+        取一个空闲标签页执行 task(tab, product_id)；没有空闲标签页时等待
+
+        返回:
+        (task 的返回值, 错误信息)；出错时返回值为 None，所有标签页都已关闭时错误信息为 NO_TAB_ERROR
+        """
+        tab = self._idle.get()
+        if tab is _CLOSED:
+            # 放回去，让其他等待的线程也能结束
+            self._idle.put(_CLOSED)
+            return None, NO_TAB_ERROR
+        try:
+            return task(tab, product_id), None
+        except Exception as e:
+            print(f"[{product_id}] 抓取出错，关闭该标签页并换新: {e}")
+            self._discard(tab)
+            try:
+                tab = self._new_tab()
+            except Exception as new_tab_error:
+                # 浏览器已不可用时不再补充标签页，其余商品由剩下的标签页继续
+                print(f"打开新标签页失败: {new_tab_error}")
+                tab = None
+                if not self.live_tabs:
+                    tab = _CLOSED
+            return None, str(e)
+        finally:
+            if tab is not None:
+                self._idle.put(tab)
+
+    @property
+    def live_tabs(self):
+        with self._lock:
+            return len(self._opened)
+
+    def crawl(self, product_ids, task, on_skipped=None):
+        """
+        并发抓取全部商品，完成顺序不固定
+
+        参数:
+        product_ids - 产品ID的可迭代对象；有标签页空闲时才取下一个，可以是边领取边产出的生成器；
+                      所有标签页都已关闭后不再从中取出，未取出的商品保持原状（如任务队列中仍为待执行）
+        on_skipped - 所有标签页都已关闭后，对已取出但没能执行的商品调用 on_skipped(产品ID, 错误信息)，
+                     如在任务队列中记为失败
+
+        返回:
+        {产品ID: 错误信息}，只含出错的商品（包括已取出但没能执行的）
+        """
+        failed = {}
+        product_ids = iter(product_ids)
+
+        def skip(product_id):
+            failed[product_id] = NO_TAB_ERROR
+            if on_skipped:
+                on_skipped(product_id, NO_TAB_ERROR)
+
+        with ThreadPoolExecutor(max_workers=self.tabs) as executor:
+            futures = {executor.submit(self.run, task, product_id): product_id
+                       for product_id in islice(product_ids, self.tabs)}
+            while futures:
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    product_id = futures.pop(future)
+                    _, error = future.result()
+                    if error is NO_TAB_ERROR:
+                        skip(product_id)
+                    elif error is not None:
+                        failed[product_id] = error
+                    if not self.live_tabs:
+                        continue
+                    for next_id in islice(product_ids, 1):
+                        futures[executor.submit(self.run, task, next_id)] = next_id
+        if not self.live_tabs:
+            print("所有标签页都已关闭，停止抓取，未开始的商品留待下次运行")
+        return failed
+
+    def close(self):
+        with self._lock:
+            opened, self._opened = self._opened, []
+        for tab in opened:
+            try:
+                tab.close()
+            except Exception:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()